@@ -5,12 +5,18 @@ from starlette.websockets import WebSocketDisconnect
 import asyncio
 import traceback
 
+from crawl.by_scholarly import stop_executor
 from run.context1 import RunnerContext
+from run.NodeFleet import stop_fleet
+from parse.parse_service import stop_parse_service
 from run.pipline1 import GoodbyeBecauseOfError
+from tools.llm_tools import close_client
 from run.Runner1 import Runner1
 
 from app.api_tool import app
+from tools.event_tool import watch_task, wait_disconnect
 from tools.log_tool import create_logger
+from tools.metric_tool import monitor_loop_lag
 
 
 @app.websocket("/query1/{name}")
@@ -39,26 +45,62 @@ async def query1(
             logger.error(f'query1 吸收异常 {e} ' + traceback.format_exc())
 
 
+_lag_task = None
+
+
+@app.on_event("startup")
+async def start_lag_monitor():
+    """记录事件循环延迟，见 /metrics 的 loop_lag_ms"""
+    global _lag_task
+    _lag_task = asyncio.create_task(monitor_loop_lag())
+
+
+@app.on_event("shutdown")
+async def shutdown_node():
+    """关闭常驻的 node 进程、scholarly 线程池、GPT 会话、serpdog 会话和解析进程池"""
+    if _lag_task is not None:
+        _lag_task.cancel()
+    await stop_fleet()
+    stop_executor()
+    await close_client()
+    from crawl.by_serpdog import close_session  # 未使用 serpdog 时不创建会话，仅关闭
+    await close_session()
+    stop_parse_service()
+
+
 async def run_task(websocket, config):
     """Manage task execution and heartbeat."""
     logger = config.logger
     runner = Runner1(config)
     task = asyncio.create_task(runner.finish())
+    disconnect = asyncio.create_task(wait_disconnect(websocket))
+
+    async def send_progress():
+        await websocket.send_json({'type': 'Heartbeat', 'progress': runner.get_progress()})
+
+    async def flush():
+        # 流式模式下，逐篇推送已确定的结果
+        while not runner.events.empty():
+            await websocket.send_json(runner.events.get_nowait())
+
     try:
-        while not task.done():
-            await websocket.send_json({'type': 'Heartbeat', 'progress': runner.get_progress()})
-            await asyncio.sleep(5)
+        # 进度有变化时推送，任务结束或连接断开时立即返回
+        await watch_task(task, runner.notifier, send_progress, flush=flush, stop=disconnect)
+        if disconnect.done():
+            raise WebSocketDisconnect()
 
+        await flush()  # 推送剩余的消息
         # task因为异常而结束时
+        result = {'type': 'Result', 'error': None, 'data': runner.deliver_pubs()}
         if task.exception():
-            await websocket.send_json(
-                {'type': 'Result', 'error': str(task.exception()), 'data': runner.deliver_pubs()})
-        else:
-            await websocket.send_json(
-                {'type': 'Result', 'error': None, 'data': runner.deliver_pubs()})
+            result['error'] = str(task.exception())
+        if config.item.stream:
+            result['summary'] = runner.get_summary()  # 结果已逐篇推送，data只含未推送的
+        await websocket.send_json(result)
 
         await websocket.close()
     finally:
+        disconnect.cancel()
         if not task.done():
             logger.info('---------------------------------------------Task not done, canceling...')
             task.cancel()
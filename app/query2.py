@@ -5,6 +5,7 @@ from fastapi import Path, WebSocket
 from starlette.websockets import WebSocketDisconnect
 
 from api_tool import app
+from tools.event_tool import watch_task, wait_disconnect
 
 
 async def goodbye(websocket: WebSocket, msg_obj: dict):
@@ -68,12 +69,18 @@ async def do_query(websocket: WebSocket, item) -> None:
     # 创建任务
     task = asyncio.create_task(runner.run(item))
     result = {'type': 'Result', 'error': None}
+    disconnect = asyncio.create_task(wait_disconnect(websocket))
+
+    async def send_progress():
+        # 获取进度
+        obj = {'type': 'Heartbeat', 'progress': record.get_progress()}
+        await websocket.send_text(json.dumps(obj))  # 发送心跳消息
+
     try:
-        while not task.done():
-            # 获取进度
-            obj = {'type': 'Heartbeat', 'progress': record.get_progress()}
-            await websocket.send_text(json.dumps(obj))  # 发送心跳消息
-            await asyncio.sleep(5)
+        # 进度有变化时推送，任务结束或连接断开时立即返回
+        await watch_task(task, record.notifier, send_progress, stop=disconnect)
+        if disconnect.done():
+            raise WebSocketDisconnect()
 
         try:
             await task
@@ -95,6 +102,7 @@ async def do_query(websocket: WebSocket, item) -> None:
         except Exception as e:
             logger.error(f"Unexpected Error: {type(e)} {e}")
     finally:
+        disconnect.cancel()
         if not task.done():
             logger.info('Task not done, canceling...')
             task.cancel()
@@ -0,0 +1,62 @@
+"""
+网页解析的对比测试：原先的 html.parser 与 parse.fast_html
+python bench_html.py [保存的网页目录，*.html] [重复次数]
+不提供目录时使用生成的网页
+"""
+import pathlib
+import random
+import sys
+import time
+
+from bs4 import BeautifulSoup, Comment
+
+from parse.fast_html import make_soup, extract_blocks, title_words, lxml
+
+
+def old_extract_text(html_str):
+    root = BeautifulSoup(html_str, 'html.parser')
+    return [s for s in (str(t).strip() for t in root.find_all(string=True)
+                        if t.parent.name not in ('script', 'style') and not isinstance(t, Comment)) if s]
+
+
+def old_search_title(html_str, title):
+    words = title_words(title)
+    for text in old_extract_text(html_str):
+        if all(word in text.lower() for word in words):
+            return True
+    return False
+
+
+def load_pages(directory):
+    if directory:
+        return [p.read_text(encoding='utf-8', errors='ignore') for p in sorted(pathlib.Path(directory).glob('*.html'))]
+
+    from bench_llm import make_page
+    rng = random.Random(0)
+    return [make_page(i, rng)[1] for i in range(20)]
+
+
+def timeit(name, fn, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            fn(html)
+    per_page = (time.perf_counter() - start) / (repeat * len(pages)) * 1000
+    print(f'{name:<36} {per_page:8.2f} ms/页')
+
+
+if __name__ == '__main__':
+    pages = load_pages(sys.argv[1] if len(sys.argv) > 1 else None)
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    size = sum(len(p) for p in pages) / len(pages) / 1024
+    print(f'网页 {len(pages)} 篇，平均 {size:.0f} KB，lxml {"可用" if lxml is not None else "不可用"}')
+
+    title = 'Paper 7'
+    timeit('原 html.parser 提取文本', old_extract_text, pages, repeat)
+    timeit('html.parser + extract_blocks', lambda h: extract_blocks(BeautifulSoup(h, 'html.parser')), pages, repeat)
+    timeit('make_soup + extract_blocks', lambda h: extract_blocks(make_soup(h)), pages, repeat)
+    timeit('原 SearchTitleOnPage', lambda h: old_search_title(h, title), pages, repeat)
+
+    # 结果一致性：解析器不同，文本应相同
+    same = sum(extract_blocks(BeautifulSoup(h, 'html.parser')) == extract_blocks(make_soup(h)) for h in pages)
+    print(f'lxml 与 html.parser 文本结果一致 {same}/{len(pages)}')
@@ -0,0 +1,62 @@
+"""
+GPT摘要提取的压测，不需要浏览器和谷歌学术
+python bench_llm.py [篇数] [并发数] [后端 local/openai]
+"""
+import asyncio
+import random
+import sys
+import time
+
+from data import api_config
+from tools.metric_tool import metrics
+
+
+def make_page(i, rng):
+    """生成一篇带导航、正文、参考文献的网页，返回 (摘要片段, html)"""
+    words = ['graph', 'network', 'learning', 'model', 'protein', 'signal', 'method', 'data', 'deep', 'robust']
+    abstract = ' '.join(rng.choice(words) for _ in range(150))
+    nav = ''.join(f'<li><a href="/{k}">menu item {k}</a></li>' for k in range(rng.randint(50, 300)))
+    refs = ''.join(f'<p>[{k}] A. Author, Some reference title {k}, 20{k % 24:02d}.</p>' for k in range(rng.randint(20, 120)))
+    html = (f'<html><head><title>Paper {i}</title></head><body><ul>{nav}</ul>'
+            f'<h1>Paper {i}</h1><h2>Abstract</h2><p>{abstract}</p><h2>References</h2>{refs}</body></html>')
+    return abstract[:120] + '…', html
+
+
+async def bench(pages, concurrency):
+    from parse.gpt_do_page_text import GptDoPageText
+
+    rng = random.Random(0)  # 每次生成相同的网页
+    items = [make_page(i, rng) for i in range(pages)]
+    limiter = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one(cut, html):
+        nonlocal failures
+        async with limiter:
+            start = time.perf_counter()
+            try:
+                await GptDoPageText(timeout=60).get_abstract(cut, html)
+            except (GptDoPageText.GPTQueryError, GptDoPageText.GPTAnswerError):
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(cut, html) for cut, html in items])
+    total = time.perf_counter() - start
+
+    latencies.sort()
+    print(f'后端 {getattr(api_config, "llm_backend", "openai")} 篇数 {pages} 并发 {concurrency} 失败 {failures}')
+    print(f'总耗时 {total:.2f}s 吞吐 {pages / total:.2f} 篇/s')
+    for p in (50, 90, 99):
+        print(f'p{p} {latencies[min(len(latencies) - 1, len(latencies) * p // 100)]:.3f}s')
+    counters = metrics.snapshot()['counters']
+    for name in ('llm_requests', 'llm_prompt_tokens', 'gpt_batch_requests', 'gpt_batch_fallback', 'gpt_tokens_saved'):
+        print(name, counters.get(name, 0))
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    c = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    api_config.llm_backend = sys.argv[3] if len(sys.argv) > 3 else 'local'
+    asyncio.run(bench(n, c))
@@ -0,0 +1,233 @@
+import asyncio
+import contextlib
+import time
+import traceback
+
+import nodriver
+from nodriver import cdp
+
+from crawl import nodriver_tool
+from data import api_config
+
+
+def get_rss_mb(browser: nodriver.Browser):
+    """
+    :return: 浏览器进程（含子进程）占用内存MB，无法获取时返回None
+    """
+    process = getattr(browser, '_process', None)
+    if process is None:
+        return None
+
+    try:
+        import psutil
+    except ImportError:
+        return _read_proc_rss_mb(process.pid)  # 仅主进程
+
+    try:
+        p = psutil.Process(process.pid)
+        rss = p.memory_info().rss
+        for child in p.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss / 1024 / 1024
+    except psutil.Error:
+        return None
+
+
+def _read_proc_rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class PooledBrowser:
+    """
+    租借出去的浏览器，记录打开的网页数，其余属性同 nodriver.Browser
+    """
+    def __init__(self, browser: nodriver.Browser):
+        self.browser = browser
+        self.pages = 0
+        self.created = time.monotonic()
+
+    async def get(self, url='chrome://welcome', new_tab=False, new_window=False):
+        self.pages += 1
+        return await self.browser.get(url, new_tab=new_tab, new_window=new_window)
+
+    def __getattr__(self, name):
+        return getattr(self.browser, name)
+
+
+class BrowserPool:
+    """
+    常驻的浏览器池，预先启动，租借/归还，超过网页数或内存上限时回收重启
+    """
+    def __init__(self, logger, size=2, max_pages=200, max_rss_mb=1500, check_timeout=5):
+        self.logger = logger
+        self.size = size
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.check_timeout = check_timeout
+        self.closed = False
+        self._idle = asyncio.Queue()  # 空闲浏览器
+        self._slots = asyncio.Semaphore(size)  # 限制同时租借的浏览器数
+        self._tasks = set()  # 后台预热任务
+        self._leased = 0
+        self._warming = 0
+        self._warm_done = asyncio.Event()
+
+    def count(self):
+        """租借中、空闲和正在预热的浏览器总数，不超过 size"""
+        return self._leased + self._idle.qsize() + self._warming
+
+    async def start(self):
+        """预先启动浏览器"""
+        for _ in range(self.size - self.count()):
+            self._warming += 1
+            await self._warm_one()
+        self.logger.info(f'浏览器池已预热 {self._idle.qsize()}/{self.size}')
+
+    async def acquire(self) -> PooledBrowser:
+        """
+        :return: 可能抛出浏览器打开异常
+        """
+        await self._slots.acquire()
+        try:
+            while True:
+                while not self._idle.empty():
+                    pooled = self._idle.get_nowait()
+                    if await self.is_healthy(pooled):
+                        self._leased += 1
+                        return pooled
+                    self.logger.info('浏览器健康检查失败，准备替换')
+                    self._discard(pooled)
+                if self._warming and self.count() >= self.size:
+                    await self._warm_done.wait()  # 等待预热中的浏览器，不另外启动
+                    continue
+                break
+
+            self._leased += 1
+            try:
+                return PooledBrowser(await nodriver_tool.create(self.logger))
+            except BaseException:
+                self._leased -= 1
+                raise
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, pooled: PooledBrowser):
+        """归还浏览器，同步调用"""
+        self._leased -= 1
+        try:
+            reason = self.need_recycle(pooled)
+            if reason:
+                self.logger.info(f'回收浏览器 {reason}')
+                self._discard(pooled)
+                self._refill()
+            elif self.count() >= self.size:
+                self.logger.info('回收浏览器 浏览器池已满')
+                self._discard(pooled)
+            else:
+                self._idle.put_nowait(pooled)
+        finally:
+            self._slots.release()
+
+    @contextlib.asynccontextmanager
+    async def lease(self):
+        pooled = await self.acquire()
+        try:
+            yield pooled
+        finally:
+            self.release(pooled)
+
+    def need_recycle(self, pooled: PooledBrowser):
+        if self.closed:
+            return '浏览器池已关闭'
+        if pooled.stopped:
+            return '浏览器已停止'
+        if self.max_pages and pooled.pages >= self.max_pages:
+            return f'网页数 {pooled.pages}'
+        rss = get_rss_mb(pooled.browser)
+        if self.max_rss_mb and rss is not None and rss > self.max_rss_mb:
+            return f'内存 {rss:.0f}MB'
+        return None
+
+    async def is_healthy(self, pooled: PooledBrowser):
+        if pooled.stopped:
+            return False
+        try:
+            await asyncio.wait_for(pooled.connection.send(cdp.browser.get_version()), self.check_timeout)
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f'浏览器健康检查异常 {type(e)} {e}')
+            return False
+
+    async def close(self):
+        self.closed = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._warming = 0  # 未开始就被取消的预热
+        self._warm_done.set()
+        while not self._idle.empty():
+            self._discard(self._idle.get_nowait())
+        self.logger.info('浏览器池已关闭')
+
+    async def _warm_one(self):
+        """调用前已计入 _warming"""
+        try:
+            browser = await nodriver_tool.create(self.logger)
+        except Exception as e:
+            self.logger.error(f'预热浏览器失败 {e}')
+            return
+        finally:
+            self._warming -= 1
+            # 唤醒等待预热的租借
+            done, self._warm_done = self._warm_done, asyncio.Event()
+            done.set()
+        if self.closed or self.count() >= self.size:
+            self._discard(PooledBrowser(browser))
+        else:
+            self._idle.put_nowait(PooledBrowser(browser))
+
+    def _refill(self):
+        if self.closed or self.count() >= self.size:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._warm_one())
+        except RuntimeError:  # 无事件循环时，下次租借再启动
+            return
+        self._warming += 1
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _discard(self, pooled: PooledBrowser):
+        try:
+            pooled.browser.stop()  # 标准关闭
+        except Exception as e:
+            self.logger.info('关闭浏览器异常 ' + traceback.format_exc())
+
+
+_pool = None
+
+
+def get_pool(logger) -> BrowserPool:
+    """进程内共用的浏览器池"""
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool(
+            logger,
+            size=getattr(api_config, 'browser_pool_size', 2),
+            max_pages=getattr(api_config, 'browser_max_pages', 200),
+            max_rss_mb=getattr(api_config, 'browser_max_rss_mb', 1500),
+        )
+    return _pool
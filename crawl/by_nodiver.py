@@ -1,10 +1,9 @@
 import traceback
 
-import asyncio
-
 from nodriver.core.browser import Browser, Config
 
-from crawl import nodriver_tool
+from crawl.browser_pool import get_pool
+from crawl.readiness import open_tab, wait_page
 
 
 class Crawl:
@@ -13,7 +12,7 @@ class Crawl:
         """
         :return: 可能抛出浏览器打开异常
         """
-        browser = await nodriver_tool.create(logger)
+        browser = await get_pool(logger).acquire()  # 从浏览器池租借
 
         return cls(logger, browser)
 
@@ -27,26 +26,22 @@ class Crawl:
         return self
 
     async def fetch_page(self, url, keywords=(), selectors=(), wait_sec=5):
+        """
+        内容出现且网页加载完成（或网络空闲）即返回，不再固定等待
+        :param wait_sec: 无该网站记录时，在元素等待时间之外额外允许的秒数
+        """
         # 打开网页
-        page = await self.browser.get(url, new_tab=True)  # debug 需要在new_tab，否则会竞争页面
+        page, tracker = await open_tab(self.browser, url)  # debug 需要在new_tab，否则会竞争页面
         try:
-            # 等待页面加载
-            await page.wait(wait_sec)
+            # 等待页面加载，检查元素加载（需要所有都存在）
+            if not await wait_page(page, tracker, url, wait_sec + 10, keywords, selectors):
+                raise self.WaitPageError(f'nodriver等待页面加载失败 url:{url} wait_for:{keywords, selectors}')
 
             # if await self.has_captcha(page):
             #     raise self.CaptchaPageError(f'nodriver打开网页含验证码 url:{url} wait_for:{keywords}')
 
-            # 检查元素加载
-            for word in keywords:  # 需要所有都存在
-                await page.wait_for(text=word, timeout=10)
-            for css in selectors:
-                await page.wait_for(selector=css, timeout=10)
-
             content = await page.get_content()
             return content
-        except asyncio.exceptions.TimeoutError as e:
-            self.logger.error(f'{e}')
-            raise self.WaitPageError(f'nodriver等待页面加载失败 url:{url} wait_for:{keywords, selectors}')
         finally:
             await page.close()  # debug 关闭页面，释放内存
 
@@ -83,10 +78,14 @@ class Crawl:
         return False
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        # 关闭浏览器
-        self.logger.info('准备关闭浏览器')
+        # 归还浏览器，不关闭
+        if self.browser is None:
+            return
+        self.logger.info('准备归还浏览器')
         try:
-            self.browser.stop()  # 标准关闭
+            get_pool(self.logger).release(self.browser)
         except Exception as e:
             self.logger.info(traceback.format_exc())
             raise e  # 再次抛出，不影响原异常
+        finally:
+            self.browser = None  # 只归还一次
@@ -2,9 +2,9 @@ import asyncio
 import traceback
 import urllib.parse
 
-from bs4 import BeautifulSoup
-
 from crawl.by_nodiver import Crawl
+from parse.fast_html import make_soup
+from parse.parse_service import get_parse_service
 from tools.people_name_tools import match_names
 
 
@@ -48,42 +48,49 @@ class ByResearchGate:
         sls = ('.search-indent-container',)
         text = await self.crawl.fetch_page(url, keywords=kws, selectors=sls)
 
-        # scraping
-        soup = BeautifulSoup(text, 'html.parser')
-        container = soup.find("div", class_="search-indent-container")
+        # scraping（较大的网页在子进程中解析）
         first_author = pub['author'].split(',')[0]
-
-        # def is_the_author(full_name):
-        #     for s in first_author.split():  # 假设reseachgate作者名字全写
-        #         if s not in full_name:
-        #             return False
-        #     return True
-
-        # 文本相似匹配
-        links = []
-
-        for nova_item in container.find_all("div", class_="nova-legacy-o-stack__item"):
-            # 匹配标题
-            link = nova_item.find("a", string=lambda s: s and title.lower() in s.lower())
-            if not link:
-                continue
-
-            # 匹配作者
-            flag = False
-            for author in soup.find_all('span', {
-                'class': 'nova-legacy-v-person-inline-item__fullname',
-                "itemprop": "name"
-            }):
-                name = author.text
-                if match_names(first_author, name):
-                    flag = True
-                    break
-
-            if not flag:
-                continue
-
-            # 提取链接 URL
-            url = 'https://www.researchgate.net/' + link["href"]
-            links.append(url)
-
-        return links
+        return await get_parse_service().run(parse_links, text, title, first_author)
+
+
+def parse_links(text, title, first_author):
+    """
+    :return: 搜索结果中标题和第一作者都匹配的文献链接
+    """
+    soup = make_soup(text)
+    container = soup.find("div", class_="search-indent-container")
+
+    # def is_the_author(full_name):
+    #     for s in first_author.split():  # 假设reseachgate作者名字全写
+    #         if s not in full_name:
+    #             return False
+    #     return True
+
+    # 文本相似匹配
+    links = []
+
+    for nova_item in container.find_all("div", class_="nova-legacy-o-stack__item"):
+        # 匹配标题
+        link = nova_item.find("a", string=lambda s: s and title.lower() in s.lower())
+        if not link:
+            continue
+
+        # 匹配作者
+        flag = False
+        for author in soup.find_all('span', {
+            'class': 'nova-legacy-v-person-inline-item__fullname',
+            "itemprop": "name"
+        }):
+            name = author.text
+            if match_names(first_author, name):
+                flag = True
+                break
+
+        if not flag:
+            continue
+
+        # 提取链接 URL
+        url = 'https://www.researchgate.net/' + link["href"]
+        links.append(url)
+
+    return links
@@ -1,11 +1,13 @@
 import asyncio
 import traceback
 
-from bs4 import BeautifulSoup
 from scholarly import scholarly, ProxyGenerator, Publication
 
 from data import api_config
+from parse.fast_html import make_soup
+from tools.executor_tool import MeteredExecutor
 
+from record.SearchCache import get_search_cache
 from run.pipline1 import QueryItem
 
 
@@ -38,26 +40,45 @@ def parse_pub(json_obj):
     }
 
 
-async def query_scholar(item: QueryItem):
+async def fetch_page(item: QueryItem, i):
     """
-    :return: 一次生成最多10篇文章
+    :return: 第i页的文献，优先取缓存
     """
-    pages = item.pages
-    # 从第0页开始
-    i = 0
-    pubs = []
-    # 遍历生成器，结束时自动退出
-    async for res in SearchPubsAsync(item):
-        pub = parse_pub(res)
-        pubs.append(pub)
-        if len(pubs) == 10:  # 每隔一页
-            full_page = pubs
-            pubs = []  # 重新装载
-            yield full_page
-
-            i += 1
-            if i >= pages:  # debug
+    cache = get_search_cache()
+    pubs = await cache.get('scholarly', item.name, item.year_low, item.year_high, i)
+    if pubs is None:
+        # 从第i页开始搜索，各页相互独立
+        search = SearchPubsAsync(item, start_page=i)
+        pubs = [parse_pub(res) for res in await search.next_page()]
+        await cache.put('scholarly', item.name, item.year_low, item.year_high, i, pubs)
+    return pubs
+
+
+async def query_scholar(item: QueryItem, lookahead=None):
+    """
+    :param lookahead: 预先获取后面几页，消费方取走一页后才补充（背压）
+    :return: 一次生成最多10篇文章，已缓存的页不再请求
+    """
+    if lookahead is None:
+        lookahead = getattr(api_config, 'scholarly_prefetch_pages', 2)
+    tasks = {}  # 页码 -> 获取任务
+    try:
+        for i in range(item.pages):
+            for j in range(i, min(i + 1 + lookahead, item.pages)):
+                if j not in tasks:
+                    tasks[j] = asyncio.create_task(fetch_page(item, j))
+
+            pubs = await tasks.pop(i)
+            if not pubs:
+                break
+            yield pubs
+            if len(pubs) < 10:  # 最后一页
                 break
+    finally:
+        # 生成器关闭（如客户端断开）时取消未取走的页
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
 
     # 结束生成器
 
@@ -67,9 +88,10 @@ class QueryScholarlyError(Exception):
 
 
 class SearchPubsAsync:
-    def __init__(self, item: QueryItem):
+    def __init__(self, item: QueryItem, start_page=0):
         self.item = item
         self.q = None
+        self.page = start_page  # 下一次 next_page 返回的页码
 
     def __aiter__(self):
         return self
@@ -78,7 +100,8 @@ class SearchPubsAsync:
         # 初始化生成器
         item = self.item
         name = self.item.name
-        self.q = scholarly.search_pubs(name, year_low=item.year_low, year_high=item.year_high)
+        self.q = scholarly.search_pubs(name, year_low=item.year_low, year_high=item.year_high,
+                                       start_index=10 * self.page)
 
     def next_to_anext(self):
         try:
@@ -92,9 +115,44 @@ class SearchPubsAsync:
             raise QueryScholarlyError(e)
 
     async def __anext__(self):
-        value = await asyncio.to_thread(self.next_to_anext)
+        value = await get_executor().run(self.next_to_anext)
         return value
 
+    def next_page_sync(self):
+        results = []
+        try:
+            while len(results) < 10:
+                results.append(self.next_to_anext())
+        except StopAsyncIteration:
+            pass
+        return results
+
+    async def next_page(self):
+        """
+        :return: 下一页的原始结果，最多10篇，没有更多时为空列表；整页在线程池中一次完成
+        """
+        results = await get_executor().run(self.next_page_sync)
+        self.page += 1
+        return results
+
+
+_executor = None
+
+
+def get_executor() -> MeteredExecutor:
+    """scholarly 搜索专用线程池，不与默认线程池（bibtex 等）互相占用"""
+    global _executor
+    if _executor is None:
+        _executor = MeteredExecutor('scholarly_executor', getattr(api_config, 'scholarly_search_workers', 4))
+    return _executor
+
+
+def stop_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
 
 def get_bib_link(pub):
     raw_pub = pub.get('raw_pub')
@@ -105,12 +163,19 @@ def get_bib_link(pub):
     return base_url + raw_pub['url_scholarbib'] if 'url_scholarbib' in raw_pub else None
 
 
+class BibtexMissingError(Exception):
+    """文献没有BibTeX链接，重试也无用"""
+    pass
+
+
 async def fill_bibtex(pub):
     pub['BibTeX'] = {'link': None, 'string': None}
 
     # 通过原始pub对象获取
     raw_pub = pub['raw_pub']
-    pub['BibTeX']['link'] = get_bib_link(raw_pub)
+    pub['BibTeX']['link'] = get_bib_link(pub)
+    if pub['BibTeX']['link'] is None:
+        raise BibtexMissingError('无url_scholarbib')
 
     bib_str = await asyncio.to_thread(scholarly.bibtex, raw_pub)
     pub['BibTeX']['string'] = bib_str
@@ -134,7 +199,7 @@ async def get_version_urls(version_link):
 
     # 解析页面
     html = html.replace(u'\xa0', u' ')
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = make_soup(html)
     rows = soup.find_all('div', class_='gs_r gs_or gs_scl')
     version_urls = []
     for row in rows:
@@ -2,9 +2,10 @@ import asyncio
 import traceback
 import urllib.parse
 
-from bs4 import BeautifulSoup
-
 from crawl.by_nodiver import Crawl
+from crawl.readiness import open_tab, wait_page
+from parse.fast_html import make_soup
+from parse.parse_service import get_parse_service
 from tools.people_name_tools import match_names
 
 
@@ -21,8 +22,11 @@ class BySema:
         url = 'https://www.semanticscholar.org/search'
         url = f"{url}?{urllib.parse.urlencode(payload)}"
         # 打开网页
-        page = await self.crawl.browser.get(url, new_tab=True)
+        page, tracker = await open_tab(self.crawl.browser, url)
         try:
+            # 检索结果出现即开始
+            if not await wait_page(page, tracker, url, 20, selectors=('.result-page',)):
+                raise asyncio.TimeoutError('Semantic Scholar检索结果未出现')
             return await self._get_paper_html(pub, page)
         except asyncio.CancelledError:
             raise
@@ -34,37 +38,16 @@ class BySema:
             await page.close()
 
     async def _get_paper_html(self, pub, page):
-        await page.wait(10)
-        await page.wait_for(selector='.result-page', timeout=10)
         # 检索结果
         title = pub['title']
         first_author = pub['author'].split(',')[0]
-        targets = []
-        soup = BeautifulSoup(await page.get_content(), 'html.parser')
-        result = soup.find('div', attrs={'class': 'result-page'})
-        for h2 in result.find_all('h2', attrs={'class': 'cl-paper-title'}):
-            # 匹配标题
-            if not title.lower() in h2.text.lower():
-                continue
-
-            target = h2.find_parents(lambda tag: 'cl-paper-row' in tag.get('class', []))
-            target = target[0]
-            # 匹配作者
-            cl_authors = target.find('span', attrs={'class': 'cl-paper-authors'})
-            authors = []
-            for span in cl_authors.find_all('span', attrs={'data-heap-id': 'heap_author_list_item'}):
-                authors.append(span.text)
-
-            # print('authors', authors)
-            if not match_names(first_author, authors[0]):
-                continue
-
-            targets.append(target)
+        # 较大的网页在子进程中解析
+        data_ids = await get_parse_service().run(parse_paper_ids, await page.get_content(), title, first_author)
 
         htmls = []
-        for target in targets:
+        for data_id in data_ids:
             try:
-                html = await self._get_target_html(target, page)
+                html = await self._get_target_html(data_id, page)
                 htmls.append(html)
             except asyncio.CancelledError:
                 raise
@@ -75,8 +58,7 @@ class BySema:
         assert len(htmls) > 0
         return htmls
 
-    async def _get_target_html(self, target, page):
-        data_id = target['data-paper-id']
+    async def _get_target_html(self, data_id, page):
         # 浏览器中选中该文献
         js = f"""const paper = document.querySelector('div[data-paper-id="{data_id}"]');"""
         await page.evaluate(js)
@@ -90,7 +72,39 @@ class BySema:
                 }"""
         await page.evaluate(js)
         # 展开摘要后，获取网页内容
-        soup = BeautifulSoup(await page.get_content(), 'html.parser')
-        paper = soup.select_one(f'div[data-paper-id="{data_id}"]')
-        html_str = str(paper)
+        html_str = await get_parse_service().run(select_paper_html, await page.get_content(), data_id)
         return html_str
+
+
+def parse_paper_ids(html_str, title, first_author):
+    """
+    :return: 搜索结果中标题和第一作者都匹配的文献id
+    """
+    targets = []
+    soup = make_soup(html_str)
+    result = soup.find('div', attrs={'class': 'result-page'})
+    for h2 in result.find_all('h2', attrs={'class': 'cl-paper-title'}):
+        # 匹配标题
+        if not title.lower() in h2.text.lower():
+            continue
+
+        target = h2.find_parents(lambda tag: 'cl-paper-row' in tag.get('class', []))
+        target = target[0]
+        # 匹配作者
+        cl_authors = target.find('span', attrs={'class': 'cl-paper-authors'})
+        authors = []
+        for span in cl_authors.find_all('span', attrs={'data-heap-id': 'heap_author_list_item'}):
+            authors.append(span.text)
+
+        # print('authors', authors)
+        if not match_names(first_author, authors[0]):
+            continue
+
+        targets.append(target['data-paper-id'])
+
+    return targets
+
+
+def select_paper_html(html_str, data_id):
+    paper = make_soup(html_str).select_one(f'div[data-paper-id="{data_id}"]')
+    return str(paper)
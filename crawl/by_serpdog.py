@@ -1,10 +1,17 @@
+import asyncio
 import json
+import random
 import re
 from urllib.parse import quote
 
 import aiohttp
 import requests
 
+from data import api_config
+from record.SearchCache import get_search_cache
+from tools.metric_tool import metrics
+from tools.rate_tool import TokenBucket
+
 
 class Payload:
     def __init__(self, api_key, as_ylo=None, as_yhi=None):
@@ -41,6 +48,51 @@ def get_payload(item: QueryItem, i):
     return payload
 
 
+_session = None
+_limiter = None
+_bucket = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    进程内共用的会话，复用连接，省去每次请求的 DNS、TCP、TLS 握手
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=getattr(api_config, 'serpdog_max_connections', 50),
+            limit_per_host=getattr(api_config, 'serpdog_max_connections_per_host', 20),
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        timeout = aiohttp.ClientTimeout(total=getattr(api_config, 'serpdog_timeout', 60))
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return _session
+
+
+def get_limiter() -> asyncio.Semaphore:
+    """所有查询共用的并发上限"""
+    global _limiter
+    if _limiter is None:
+        _limiter = asyncio.Semaphore(getattr(api_config, 'serpdog_concurrency', 10))
+    return _limiter
+
+
+def get_bucket() -> TokenBucket:
+    """按 api 套餐设置的请求速率"""
+    global _bucket
+    if _bucket is None:
+        _bucket = TokenBucket(getattr(api_config, 'serpdog_rate', 5), getattr(api_config, 'serpdog_burst', 5))
+    return _bucket
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
 class BySerpdog:
 
     def __init__(self, logger):
@@ -70,24 +122,64 @@ class BySerpdog:
             })
         return pubs
 
+    async def request(self, url, params, read):
+        """
+        限速请求，429时退避重试
+        :param read: 读取响应的协程函数
+        """
+        retries = getattr(api_config, 'serpdog_429_retries', 3)
+        for attempt in range(retries + 1):
+            await get_bucket().acquire()
+            async with get_limiter(), get_session().get(url, params=params) as resp:
+                if resp.status == 429 and attempt < retries:
+                    retry_after = resp.headers.get('Retry-After', '')
+                    delay = float(retry_after) if retry_after.isdigit() else 2 ** attempt + random.random()
+                    metrics.incr('serpdog_429')
+                    self.logger.warning(f'serpdog限流，{delay:.1f}秒后重试')
+                    get_bucket().pause(delay)
+                    continue
+
+                if resp.status != 200:
+                    self.logger.error(f'{resp.status} {await resp.text()}')
+                    raise self.SerpdogError('serpdog\'s api请求失败')
+
+                return await read(resp)
+
+    async def fetch_page(self, item: QueryItem, i):
+        """
+        :return: 第i页的文献，优先取缓存
+        """
+        cache = get_search_cache()
+        year_low, year_high = item.payload.as_ylo, item.payload.as_yhi
+        pubs = await cache.get('serpdog', item.name, year_low, year_high, i)
+        if pubs is None:
+            # 一整页获取
+            obj = await self.request('https://api.serpdog.io/scholar', get_payload(item, i),
+                                     lambda resp: resp.json(encoding='utf-8'))
+            pubs = self.parse_pubs(obj)
+            await cache.put('serpdog', item.name, year_low, year_high, i, pubs)
+        return pubs
+
     async def query_scholar(self, item: QueryItem):
         """
-        :return: 一次生成最多10篇文章
+        各页同时获取（受限速约束），按页码顺序生成
+        :return: 一次生成最多10篇文章，已缓存的页不再请求
         """
-        async with aiohttp.ClientSession() as session:
+        lookahead = getattr(api_config, 'serpdog_prefetch_pages', 4)
+        tasks = {}  # 页码 -> 获取任务
+        try:
             for i in range(item.pages):
-                # 一整页获取
-                # 创建查询
-                payload = get_payload(item, i)
-                async with session.get('https://api.serpdog.io/scholar', params=payload) as resp:
-                    if resp.status != 200:
-                        self.logger.error(f'{resp.status} {await resp.text()}')
-                        raise self.SerpdogError('serpdog\'s api请求失败')
-
-                    pubs = self.parse_pubs(await resp.json(encoding='utf-8'))
-                    # generate new group of pubs
-                    yield pubs
-        # 暂时不处理异常
+                for j in range(i, min(i + 1 + lookahead, item.pages)):
+                    if j not in tasks:
+                        tasks[j] = asyncio.create_task(self.fetch_page(item, j))
+
+                pubs = await tasks.pop(i)
+                # generate new group of pubs
+                yield pubs
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
 
     async def get_bibtex_link(self, pub, item: QueryItem):
         api_key = item.payload.api_key
@@ -95,33 +187,23 @@ class BySerpdog:
             'api_key': api_key,
             'q': pub['id'],
         }
-        async with aiohttp.ClientSession() as session:
-            async with session.get('https://api.serpdog.io/scholar_cite', params=payload) as resp:
-                if resp.status != 200:
-                    self.logger.error(f'{resp.status} {await resp.text()}')
-                    raise self.SerpdogError('serpdog\'s api请求失败')
-
-                obj = await resp.json(encoding='utf-8')  # 不太会是中文
-                # 解析链接
-                for link in obj['links']:
-                    if link['name'] == 'BibTeX':
-                        return link['link']  # 暂不获取内容
-
-                raise KeyError(f'No BibTeX link in {obj}')
+        obj = await self.request('https://api.serpdog.io/scholar_cite', payload,
+                                 lambda resp: resp.json(encoding='utf-8'))  # 不太会是中文
+        # 解析链接
+        for link in obj['links']:
+            if link['name'] == 'BibTeX':
+                return link['link']  # 暂不获取内容
+
+        raise KeyError(f'No BibTeX link in {obj}')
         # 未处理异常
 
     async def get_bibtex_string(self, bibtex_link, item: QueryItem):
         api_key = item.payload.api_key
         bibtex_link = quote(bibtex_link)
         payload = {'api_key': api_key, 'url': bibtex_link, 'render_js': 'false'}
-        async with aiohttp.ClientSession() as session:
-            async with session.get('https://api.serpdog.io/scrape', params=payload) as resp:
-                if resp.status != 200:
-                    self.logger.error(f'{resp.status} {await resp.text()}')
-                    raise self.SerpdogError('serpdog\'s api请求失败')
-
-                string = await resp.text(encoding='utf-8')
-                return string
+        string = await self.request('https://api.serpdog.io/scrape', payload,
+                                    lambda resp: resp.text(encoding='utf-8'))
+        return string
 
     class SerpdogError(Exception):
         pass
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+import nodriver
+from nodriver import cdp
+
+from crawl.resource_block import get_policy
+from crawl.wait_page_tool import wait_in_page
+from data import api_config
+from record.SqliteCache import SqliteCache
+from tools.metric_tool import metrics
+
+
+def get_domain(url):
+    domain = urlsplit(url).netloc.lower()
+    return domain[4:] if domain.startswith('www.') else domain
+
+
+class NetworkTracker:
+    """
+    通过CDP Network事件记录进行中的请求，判断网络是否空闲
+    """
+    def __init__(self, max_inflight=2):
+        self.max_inflight = max_inflight  # 长连接、轮询等可能一直不结束
+        self.inflight = set()
+        self.changed = time.monotonic()
+        self.bytes = 0  # 已下载的字节数
+
+    async def attach(self, page: nodriver.Tab):
+        page.add_handler(cdp.network.RequestWillBeSent, self._on_request)
+        page.add_handler(cdp.network.LoadingFinished, self._on_done)
+        page.add_handler(cdp.network.LoadingFailed, self._on_done)
+        await page.send(cdp.network.enable())
+
+    def _on_request(self, event):
+        self.inflight.add(event.request_id)
+        self.changed = time.monotonic()
+
+    def _on_done(self, event):
+        self.inflight.discard(event.request_id)
+        self.changed = time.monotonic()
+        self.bytes += int(getattr(event, 'encoded_data_length', 0) or 0)  # 失败的请求没有
+
+    def idle_for(self):
+        """
+        :return: 进行中的请求不超过max_inflight已持续的秒数
+        """
+        if len(self.inflight) > self.max_inflight:
+            return 0.0
+        return time.monotonic() - self.changed
+
+
+async def open_tab(browser, url):
+    """
+    先打开空白页，挂上网络监听和资源屏蔽后再跳转，不漏掉最初的请求
+    :return: (page, tracker)
+    """
+    page = await browser.get('about:blank', new_tab=True)
+    tracker = NetworkTracker()
+    try:
+        await tracker.attach(page)
+        policy = get_policy()
+        if policy is not None:
+            await policy.attach(page, get_domain(url))
+        await page.send(cdp.page.navigate(url))
+    except BaseException:
+        await page.close()
+        raise
+    return page, tracker
+
+
+def content_js(keywords=(), selectors=(), check_js=None):
+    """
+    :return: 判断内容是否出现的JS函数
+    """
+    if check_js is not None:
+        return check_js
+    return """() => {
+      const text = document.body ? document.body.innerText : '';
+      return %s.every((word) => text.includes(word)) && %s.every((css) => document.querySelector(css));
+    }""" % (json.dumps(list(keywords)), json.dumps(list(selectors)))
+
+
+async def wait_ready(page: nodriver.Tab, tracker: NetworkTracker, keywords=(), selectors=(), check_js=None,
+                     timeout=30, idle=0.5):
+    """
+    先在网页中等待内容出现（MutationObserver），再等待网页加载完成或网络空闲，都满足时立即返回
+    :param check_js: 自定义判断内容的JS函数，代替keywords和selectors
+    :return: 内容是否在超时前出现；内容已出现但未加载完成时也视为就绪
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    # 尚未跳转离开空白页时不算
+    check = f"() => location.href !== 'about:blank' && ({content_js(keywords, selectors, check_js)})()"
+    if not await wait_in_page(page, check, timeout):
+        return False
+
+    while loop.time() < deadline:
+        try:
+            ready_state = await page.evaluate('document.readyState')
+        except Exception:  # 跳转中，执行环境尚未建立
+            ready_state = 'loading'
+        if ready_state == 'complete' or (ready_state == 'interactive' and tracker.idle_for() >= idle):
+            break
+        await asyncio.sleep(0.2)
+    return True
+
+
+class LoadTimes:
+    """
+    按域名学习网页就绪所需时间（指数平均），据此设置等待上限；多个进程共用，每次读写都经过数据库
+    """
+    def __init__(self, store: SqliteCache, factor=3.0, min_timeout=5.0, max_timeout=60.0):
+        self.store = store
+        self.factor = factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+
+    async def timeout_for(self, url, default):
+        """
+        :param default: 记录不足时使用
+        """
+        record = await self.store.aget_first([get_domain(url)])
+        if not record or record['n'] < 3:
+            return default
+        return min(self.max_timeout, max(self.min_timeout, self.factor * record['avg']))
+
+    async def record(self, url, seconds):
+        def update(record):
+            if record is None:
+                return {'avg': seconds, 'n': 1}
+            return {'avg': 0.7 * record['avg'] + 0.3 * seconds, 'n': record['n'] + 1}
+
+        metrics.observe('page_ready_sec', seconds)
+        await self.store.aupdate(get_domain(url), update)
+
+
+_load_times = None
+
+
+def get_load_times() -> LoadTimes:
+    global _load_times
+    if _load_times is None:
+        store = SqliteCache(getattr(api_config, 'load_time_path', 'data/cache/load_time.sqlite3'), 'load_time',
+                            max_items=20000, default_ttl=30 * 24 * 3600)
+        _load_times = LoadTimes(store, max_timeout=getattr(api_config, 'page_max_timeout', 60))
+    return _load_times
+
+
+async def wait_page(page, tracker, url, default_timeout, keywords=(), selectors=(), check_js=None):
+    """
+    按域名学习到的等待上限调用 wait_ready，并记录本次就绪时间
+    :return: 是否就绪
+    """
+    load_times = get_load_times()
+    timeout = await load_times.timeout_for(url, default_timeout)
+    start = time.monotonic()
+    ready = await wait_ready(page, tracker, keywords, selectors, check_js, timeout=timeout)
+    # 超时也记录（此时为等待上限），上限偏短的网站能逐渐放宽
+    await load_times.record(url, time.monotonic() - start)
+    metrics.incr('page_ready' if ready else 'page_not_ready')
+    metrics.observe('page_kb', tracker.bytes / 1024)
+    return ready
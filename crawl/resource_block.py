@@ -0,0 +1,99 @@
+"""
+通过CDP屏蔽网页中不需要的资源（图片、字体、音视频、统计/广告脚本），只保留解析所需的HTML和脚本
+"""
+import nodriver
+from nodriver import cdp
+
+from data import api_config
+from tools.metric_tool import metrics
+
+_TRACKERS = (
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googlesyndication.com*',
+    '*facebook.net*', '*connect.facebook.com*', '*hotjar.com*', '*scorecardresearch.com*', '*quantserve.com*',
+    '*newrelic.com*', '*nr-data.net*', '*adservice.google.*', '*criteo.com*', '*taboola.com*', '*outbrain.com*',
+    '*crazyegg.com*', '*mouseflow.com*', '*clarity.ms*', '*cookielaw.org*', '*onetrust.com*',
+)
+
+
+def _match_domain(domain, allow):
+    """
+    :return: allow 中与 domain 匹配（相同或为其上级域名）的设置
+    """
+    for key, value in allow.items():
+        if domain == key or domain.endswith('.' + key):
+            return value
+    return None
+
+
+class ResourcePolicy:
+    """
+    屏蔽策略：资源类型用 Fetch 在发出请求前拦截，统计/广告用 Network.setBlockedURLs，都不发出请求
+    """
+    def __init__(self, types=('Image', 'Font', 'Media'), url_patterns=_TRACKERS, allow=None):
+        """
+        :param allow: 按网页域名放行，{'example.com': ['Image']}，值为 '*' 时不屏蔽任何资源
+        """
+        self.types = list(types)
+        self.url_patterns = list(url_patterns)
+        self.allow = allow or {}
+
+    def rules_for(self, domain):
+        """
+        :return: (屏蔽的资源类型, 屏蔽的网址)
+        """
+        allowed = _match_domain(domain, self.allow)
+        if allowed == '*':
+            return [], []
+        allowed = set(allowed or ())
+        return [t for t in self.types if t not in allowed], self.url_patterns
+
+    @staticmethod
+    def _on_failed(event: cdp.network.LoadingFailed):
+        # setBlockedURLs 屏蔽的请求以 inspector 为原因失败
+        if event.blocked_reason == cdp.network.BlockedReason.INSPECTOR:
+            metrics.incr('blocked_requests')
+            metrics.incr('blocked_tracker')
+
+    async def attach(self, page: nodriver.Tab, domain):
+        """
+        需要在跳转前调用，且 Network 已启用
+        """
+        types, url_patterns = self.rules_for(domain)
+        if url_patterns:
+            page.add_handler(cdp.network.LoadingFailed, self._on_failed)
+            await page.send(cdp.network.set_blocked_ur_ls(url_patterns))
+        if not types:
+            return
+
+        async def on_paused(event: cdp.fetch.RequestPaused):
+            metrics.incr('blocked_requests')
+            metrics.incr(f'blocked_{event.resource_type.value.lower()}')
+            try:
+                await page.send(cdp.fetch.fail_request(event.request_id, cdp.network.ErrorReason.BLOCKED_BY_CLIENT))
+            except Exception:  # 网页已关闭
+                pass
+
+        page.add_handler(cdp.fetch.RequestPaused, on_paused)
+        # 只拦截要屏蔽的类型，HTML、脚本等请求不经过这里
+        await page.send(cdp.fetch.enable(patterns=[
+            cdp.fetch.RequestPattern(url_pattern='*', resource_type=cdp.network.ResourceType(t),
+                                     request_stage=cdp.fetch.RequestStage.REQUEST)
+            for t in types
+        ]))
+
+
+_policy = None
+
+
+def get_policy():
+    """
+    :return: 进程内共用的屏蔽策略，api_config.block_resources = False 时返回None
+    """
+    global _policy
+    if _policy is None and getattr(api_config, 'block_resources', True):
+        _policy = ResourcePolicy(
+            types=getattr(api_config, 'block_resource_types', ('Image', 'Font', 'Media')),
+            url_patterns=_TRACKERS + tuple(getattr(api_config, 'block_url_patterns', ())),
+            allow=getattr(api_config, 'block_allow', None),
+        )
+    return _policy
@@ -1,91 +1,91 @@
 import asyncio
-import re
+import json
 
 import nodriver
-from bs4 import BeautifulSoup, Comment
 
-
-async def wait_to_complete(page: nodriver.Tab, timeout):
-    loop = asyncio.get_running_loop()
-    now = loop.time()
-    while True:
-        s = await page.evaluate("document.readyState")
-        if s == 'complete':
-            return True
-
-        if loop.time() - now > timeout:  # 不抛异常
-            return False
-
-        await page.wait(0.5)
-
-
-async def wait_to_load(page: nodriver.Tab, init_wait=None, wait_gap=0.5, timeout=10):
-    if init_wait:
-        await page.wait(init_wait)
-
-    async def to_load():
-        while not (await page.evaluate("document.readyState") == 'complete'):
-            await page.wait(wait_gap)
-
-    await asyncio.wait_for(to_load(), timeout)
+from parse.fast_html import title_words
 
 
 class SearchPage:
     def get_target(self):
         pass
 
-    def __call__(self, page_content: str) -> bool:
-        pass
-
-
-async def wait_for_text(page: nodriver.Tab, search: SearchPage, timeout=10):
+    def js_check(self):
+        """
+        :return: 在网页中判断的JS函数（返回bool）
+        """
+        return None
+
+
+# 先判断一次，之后网页变化时再判断（100ms内的多次变化只判断一次），超时返回false
+_OBSERVE_JS = """
+new Promise((resolve) => {
+  const check = __CHECK__;
+  let done = false, pending = false;
+  const finish = (found) => {
+    if (done) return;
+    done = true;
+    observer.disconnect();
+    clearTimeout(deadline);
+    resolve(found);
+  };
+  const observer = new MutationObserver(() => {
+    if (pending || done) return;
+    pending = true;
+    setTimeout(() => { pending = false; if (check()) finish(true); }, 100);
+  });
+  const deadline = setTimeout(() => finish(check()), __TIMEOUT__);
+  observer.observe(document, {childList: true, subtree: true, characterData: true});
+  if (check()) finish(true);
+})
+"""
+
+
+async def wait_in_page(page: nodriver.Tab, check_js, timeout):
+    """
+    在网页中用 MutationObserver 等待条件成立，不必反复取回整个网页
+    :return: 条件是否在超时前成立
+    """
     loop = asyncio.get_running_loop()
-    now = loop.time()
+    deadline = loop.time() + timeout
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return False
 
-    content = await page.get_content()
-    # 检查是否存在
-    while not search(content):
-        if loop.time() - now > timeout:
-            raise asyncio.TimeoutError(
-                f"等待网页内容时超时 {type(search)} {search.get_target()}"
-            )
-        await page.wait(0.5)
-        content = await page.get_content()
+        js = _OBSERVE_JS.replace('__CHECK__', check_js).replace('__TIMEOUT__', str(int(remaining * 1000)))
+        try:
+            found = await asyncio.wait_for(page.evaluate(js, await_promise=True), remaining + 1)
+        except asyncio.TimeoutError:
+            return False
+        except Exception:  # 网页跳转，执行环境被销毁，之后重新注入
+            found = None
 
-    return content
+        if found is True:
+            return True
+        if found is False:
+            return False
+        await page.wait(0.5)
 
 
 class SearchTitleOnPage(SearchPage):
     def __init__(self, title):
         self.title = title
+        self.words = title_words(title)
 
     def get_target(self):
         return self.title
 
-    def __call__(self, page_content: str):
-        title = self.title
-        # 使用正则表达式分割字符串，保留字母、数字、连字符和下划线
-        words = re.split(r'[^a-zA-Z0-9_-]+', title)
-        # 去除空字符串
-        words = [word for word in words if word]
-
-        soup = BeautifulSoup(page_content, "html.parser")
-        for tag in soup.find_all(string=True):  # 遍历所有文本结点
-            if tag.parent.name in ('script', 'style',) or isinstance(tag, Comment):  # 过滤js,css,注释
-                continue
-
-            text = str(tag).strip()
-            if not text:
-                continue
-
-            # 检测标题的每一个字都在内容中
-            all_match = True
-            for word in words:
-                if word.lower() not in text.lower():
-                    all_match = False
-                    break
-
-            if all_match:
-                return True
-
-        return False
+    def js_check(self):
+        # 检测标题的每一个字都在同一文本结点中
+        return """() => {
+          const words = %s;
+          const walker = document.createTreeWalker(document.documentElement || document, NodeFilter.SHOW_TEXT);
+          for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+            const tag = node.parentNode && node.parentNode.nodeName;
+            if (tag === 'SCRIPT' || tag === 'STYLE' || tag === 'NOSCRIPT' || tag === 'TEMPLATE') continue;
+            const text = node.nodeValue.trim().toLowerCase();
+            if (text && words.every((word) => text.includes(word))) return true;
+          }
+          return false;
+        }""" % json.dumps(self.words)
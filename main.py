@@ -6,6 +6,14 @@ def read_root():
     return {"Hello": "World"}
 
 
+@app.get("/metrics")
+async def read_metrics():
+    """主进程与各子结点（爬取摘要、访问GPT均在子结点中）的指标合并"""
+    from run.NodeFleet import fleet_metrics
+    from tools.metric_tool import metrics, merge_snapshots
+    return merge_snapshots(metrics.snapshot(), await fleet_metrics())
+
+
 if __name__ == '__main__':
     # uvicorn 内嵌式启动
     import uvicorn
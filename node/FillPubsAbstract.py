@@ -1,9 +1,17 @@
 import asyncio
 import traceback
 
-from crawl.wait_page_tool import wait_to_complete, wait_for_text, SearchTitleOnPage
+from crawl.readiness import open_tab, wait_page
+from crawl.wait_page_tool import SearchTitleOnPage
 from node.node_pipline import TaskConfig, ErrorToTell
+from data import api_config
+from parse.condense_text import record_saved
 from parse.gpt_do_page_text import GptDoPageText
+from parse.parse_jobs import analyze_page, locate_xpath
+from parse.parse_service import get_parse_service
+from parse.rule_abstract import matches_cut
+from record.RecordEx import get_xpath_store, url_pattern
+from tools.metric_tool import metrics
 from tools.pub_log_tool import display_pub_url
 
 
@@ -14,11 +22,15 @@ class QuitAbstract(Exception):
 class FillPubsAbstract:
     def __init__(self, config: TaskConfig):
         self.config = config
-        self._uc_lock = asyncio.Semaphore(5)
+        self._uc_lock = asyncio.Semaphore(getattr(api_config, 'node_pages_per_browser', 5))
 
-    async def finish(self, pubs):
+    async def finish(self, pubs, on_result=None):
+        """
+        :param on_result: 每篇结束时回调 on_result(pub, error)，error为None时正常结束（摘要可能为空）；
+            不提供时，任一篇出现未知异常则中断全部
+        """
         logger = self.config.logger
-        tasks = [asyncio.create_task(self.fill_abstract(pub)) for pub in pubs]
+        tasks = [asyncio.create_task(self.fill_and_report(pub, on_result)) for pub in pubs]
         try:
             # 爬取网页
             logger.info(f'准备异步爬取 {display_pub_url(pubs)}')
@@ -34,6 +46,19 @@ class FillPubsAbstract:
                 # 等待所有任务完成取消
             await asyncio.gather(*tasks, return_exceptions=True)
 
+    async def fill_and_report(self, pub, on_result):
+        if on_result is None:
+            return await self.fill_abstract(pub)
+
+        try:
+            await self.fill_abstract(pub)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await on_result(pub, e)  # 只影响本篇
+            return
+        await on_result(pub, None)
+
     async def fill_abstract(self, pub):
         """
         限制异步访问数量
@@ -57,7 +82,7 @@ class FillPubsAbstract:
 
     async def _fill_abstract(self, pub):
         """
-        等待时间: 固定2s + 标题出现不超过30s + 网页加载完毕不超过30s
+        等待时间: 标题出现且加载完成，不超过按网站学习到的上限（无记录时30s）
         GPT询问时间: 不超过60s
         总时间: (等待时间 + GPT询问时间) 不超过2min
         """
@@ -70,26 +95,60 @@ class FillPubsAbstract:
 
         title = pub['title']
         cut = pub['cut']
-        page = await browser.get(page_url, new_tab=True)
+        page, tracker = await open_tab(browser, page_url)
         try:
-            try:
-                await page.wait(2)
-                # 确保标签出现
-                await wait_for_text(page, SearchTitleOnPage(title), timeout=30)
-                if not await wait_to_complete(page, 30):
-                    logger.debug(f'网页未等待加载完成 {page_url}')
-            except asyncio.TimeoutError as e:
+            # 标题出现，且网页加载完成或网络空闲
+            if not await wait_page(page, tracker, page_url, 30, check_js=SearchTitleOnPage(title).js_check()):
                 logger.debug(f'失败网页截图 {await page.save_screenshot()}')
                 raise QuitAbstract('网页等待超时')
 
             try:
                 html_str = await page.get_content()
+                store = get_xpath_store(logger)
+                base_url = await asyncio.to_thread(store.search_history, page_url)
+                xpaths = await asyncio.to_thread(store.get_xpaths, base_url) if base_url else None
+                # 一次解析（较大时在子进程中）：规则提取、按xpath提取、文本压缩
+                budget = getattr(api_config, 'gpt_text_token_budget', 3000)
+                result = await get_parse_service().run(analyze_page, html_str, cut, budget, xpaths)
+
+                # 先用规则提取，可信度不足时再访问GPT
+                if result['rule_score'] >= getattr(api_config, 'rule_abstract_min_confidence', 0.8):
+                    metrics.incr('rule_abstract_hit')
+                    logger.debug(f'规则提取到摘要 {result["rule_score"]:.2f} #{pub["task_id"]}')
+                    pub['abstract'] = result['rule_abstract']
+                    return
+                metrics.incr('rule_abstract_miss')
+
+                # 已学习过的同类网页，按xpath提取
+                if base_url is not None:
+                    if matches_cut(result['xpath_text'], cut):
+                        metrics.incr('xpath_hit')
+                        await asyncio.to_thread(store.success_xpaths, base_url)
+                        logger.debug(f'按xpath提取到摘要 {base_url}')
+                        pub['abstract'] = result['xpath_text']
+                        return
+                    metrics.incr('xpath_miss')
+                    if base_url == url_pattern(page_url):  # 借用同网站其他模式时，不因本网页失败而停用
+                        await asyncio.to_thread(store.disable_xpaths, base_url)
+
                 gpt = GptDoPageText(timeout=60)
                 # 访问GPT，提取结果
-                pub['abstract'] = await gpt.get_abstract(cut, html_str)
+                record_saved(result['full_tokens'], result['tokens'])
+                pub['abstract'] = await gpt.get_abstract_from_text(cut, result['web_txt'])
+                await self.learn_xpath(page_url, html_str, pub['abstract'])
             except (GptDoPageText.GPTQueryError, GptDoPageText.GPTAnswerError) as e:
                 logger.debug(f'失败网页截图 {await page.save_screenshot()}')
                 raise QuitAbstract(e)
         finally:
             if page in browser.tabs:
                 await page.close()
+
+    async def learn_xpath(self, page_url, html_str, abstract):
+        """在网页中找到GPT提取的摘要，记住其xpath"""
+        if not abstract:
+            return
+        xpath = await get_parse_service().run(locate_xpath, html_str, abstract)
+        if xpath is None:
+            return
+        metrics.incr('xpath_learned')
+        await asyncio.to_thread(get_xpath_store(self.config.logger).new_handled, page_url, [xpath])
@@ -3,6 +3,10 @@ import logging
 import nodriver
 
 
+# 子结点启动完成后，在 stdout 输出此行及端口
+NODE_READY = 'NODE_READY'
+
+
 class TaskConfig:
     browser: nodriver.Browser
     logger: logging.Logger
@@ -0,0 +1,70 @@
+"""
+主进程与子结点之间的消息格式，每条消息都带版本号 v 和请求 id
+
+主进程 -> 子结点:
+    fill      {'pubs': [...]}            爬取摘要
+    cancel    {}                          取消请求
+    metrics   {}                          查询子结点的指标
+子结点 -> 主进程:
+    result    {'task_id', 'abstract'}     一篇文献完成（abstract 可能为 None）
+    error     {'task_id', 'error'}        一篇文献出错，task_id 为 None 时整个请求出错
+    progress  {'done', 'total'}
+    done      {}                          请求结束，之后不再有该 id 的消息
+    metrics   {'snapshot'}                子结点的指标，回应 metrics 查询
+"""
+import json
+
+PROTOCOL_VERSION = 1
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def dumps(type_, request_id, **fields):
+    return json.dumps({'v': PROTOCOL_VERSION, 'type': type_, 'id': request_id, **fields})
+
+
+def loads(message):
+    try:
+        obj = json.loads(message)
+    except ValueError as e:
+        raise ProtocolError(f'消息不是json {e}')
+
+    if obj.get('v') != PROTOCOL_VERSION:
+        raise ProtocolError(f'协议版本不一致 {obj.get("v")} != {PROTOCOL_VERSION}')
+    if 'type' not in obj or 'id' not in obj:
+        raise ProtocolError(f'消息缺少 type 或 id')
+    return obj
+
+
+def fill_request(request_id, pubs):
+    return dumps('fill', request_id, pubs=pubs)
+
+
+def cancel_request(request_id):
+    return dumps('cancel', request_id)
+
+
+def metrics_request(request_id):
+    return dumps('metrics', request_id)
+
+
+def metrics_frame(request_id, snapshot):
+    return dumps('metrics', request_id, snapshot=snapshot)
+
+
+def result_frame(request_id, pub):
+    return dumps('result', request_id, task_id=pub['task_id'], abstract=pub.get('abstract'))
+
+
+def error_frame(request_id, error, task_id=None):
+    return dumps('error', request_id, task_id=task_id, error=str(error))
+
+
+def progress_frame(request_id, done, total):
+    return dumps('progress', request_id, done=done, total=total)
+
+
+def done_frame(request_id):
+    return dumps('done', request_id)
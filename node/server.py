@@ -1,27 +1,57 @@
+import asyncio
+import signal
 from datetime import datetime
 
 import websockets
 
+from crawl.browser_pool import get_pool
+from node.node_pipline import NODE_READY
 from node.server_handler import handle_client
+from parse.parse_service import stop_parse_service
+from tools.llm_tools import close_client
 from tools.log_tool import create_logger
+from tools.metric_tool import monitor_loop_lag
 from data import api_config
 
 
-async def open_server():
+async def open_server(port=None):
+    """
+    :param port: 为0时由系统分配，实际端口通过 stdout 告知主进程
+    """
     # 创建 logger 实例
     logger = create_logger('node', datetime.now())
-    port = api_config.sub_node_port
+    if port is None:
+        port = api_config.sub_node_port
+
+    # 预热浏览器池，供之后的所有请求租借
+    pool = get_pool(logger)
+    await pool.start()
+    lag_task = asyncio.create_task(monitor_loop_lag(logger=logger))
 
     async def handler(websocket, path):
         await handle_client(websocket, logger)
-        server.close()
 
     server = await websockets.serve(handler, "localhost", port)
+    port = server.sockets[0].getsockname()[1]  # 实际绑定的端口
     logger.info(f"WebSocket server started on ws://localhost:{port}")
+    # 通知主进程已就绪
+    print(f'{NODE_READY} {port}', flush=True)
+
+    # 常驻进程，收到结束信号时关闭
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+    except NotImplementedError:  # Windows
+        pass
 
     # 等待服务器被关闭
-    await server.wait_closed()
-    logger.info("Server has been shut down.")
+    try:
+        await server.wait_closed()
+        logger.info("Server has been shut down.")
+    finally:
+        lag_task.cancel()
+        await pool.close()
+        await close_client()
+        stop_parse_service()
 
 
 # 在项目根路径中调用
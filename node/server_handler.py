@@ -2,53 +2,92 @@ import asyncio
 import traceback
 
 import websockets
-import json
 
-from crawl import nodriver_tool
+from crawl.browser_pool import get_pool
 from node.FillPubsAbstract import FillPubsAbstract
+from node import protocol
 from node.node_pipline import TaskConfig, ErrorToTell
+from tools.metric_tool import metrics
 
 
 async def handle_client(websocket: websockets.WebSocketServerProtocol, logger):
+    """
+    同一连接上可同时处理多个请求，每篇文献完成时即返回，消息格式见 node.protocol
+    """
     logger.info("已连接")
+    tasks = {}  # 请求id -> 任务
+    try:
+        async for message in websocket:  # 客户端关闭连接时，异步生成器自然结束
+            try:
+                obj = protocol.loads(message)
+            except protocol.ProtocolError as e:
+                logger.error(f'无法解析的消息 {e}')
+                continue
+
+            request_id = obj['id']
+            if obj['type'] == 'fill':
+                task = asyncio.create_task(handle_request(websocket, request_id, obj, logger))
+                tasks[request_id] = task
+                task.add_done_callback(lambda t, i=request_id: tasks.pop(i, None))
+            elif obj['type'] == 'metrics':
+                await websocket.send(protocol.metrics_frame(request_id, metrics.snapshot()))
+            elif obj['type'] == 'cancel' and request_id in tasks:
+                logger.info(f'主进程取消请求 id:{request_id}')
+                tasks[request_id].cancel()
+
+    except asyncio.CancelledError as e:
+        logger.error(f'子结点被取消 {e}')
+    except websockets.exceptions.ConnectionClosed as e:
+        logger.error(f"连接意外中断 {e}")
+    except Exception as e:
+        logger.error(f'未知异常 {traceback.format_exc()}')
+    finally:
+        # 连接关闭时，取消未完成的请求
+        pending = list(tasks.values())
+        if pending:
+            logger.error(f"WebSocket 连接已关闭，取消未完成的请求 {len(pending)}")
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if not websocket.closed:
+            await websocket.close()
+
+
+async def handle_request(websocket, request_id, obj, logger):
+    async def send(message):
+        try:
+            await websocket.send(message)
+        except websockets.exceptions.ConnectionClosed as e:
+            logger.error(f"发送结果时连接已中断 {e}")
+
     with FillPubsContext() as context:
         try:
-            logger.info("开始创建任务资源")
-            filler = await context.create(logger)
-            async for message in websocket:  # 客户端关闭连接时，异步生成器自然结束
-                obj = json.loads(message)
-                # logger.debug(f'主进程传入参数 {obj}')
-                pubs = parse_params(obj)
-
-                # 创建并执行任务
-                task = asyncio.create_task(filler.finish(pubs))
-
-                # 等待任务完成并检查连接状态
-                while not task.done():
-                    await asyncio.sleep(3)
-                    if websocket.closed:  # 检查连接状态
-                        logger.error("在处理任务时，WebSocket 连接已关闭")
-                        task.cancel()
-                        break
-
-                # 自动抛出异常，或等待取消异常（最优化代码逻辑）
-                await task
-
-                logger.info('已完成本次任务')
-                await websocket.send(json.dumps({'pubs': pubs}))
-                logger.info('已发送结果')
-
-        except asyncio.CancelledError as e:
-            logger.error(f'子结点被取消 {e}')
+            # logger.debug(f'主进程传入参数 {obj}')
+            pubs = parse_params(obj)
+            done = 0
+
+            async def on_result(pub, error):
+                nonlocal done
+                done += 1
+                if error is None:
+                    await send(protocol.result_frame(request_id, pub))
+                else:
+                    await send(protocol.error_frame(request_id, error, pub['task_id']))
+                await send(protocol.progress_frame(request_id, done, len(pubs)))
+
+            filler = await context.create(logger)  # 每个请求租借一个浏览器
+            await filler.finish(pubs, on_result)
+            logger.info(f'已完成本次任务 id:{request_id}')
         except ErrorToTell as e:
-            await websocket.send(json.dumps({'error': str(e)}))
-        except websockets.exceptions.ConnectionClosed as e:
-            logger.error(f"连接意外中断 {e}")
+            await send(protocol.error_frame(request_id, e))
+        except asyncio.CancelledError:
+            logger.debug(f'请求被取消 id:{request_id}')
+            raise
         except Exception as e:
             logger.error(f'未知异常 {traceback.format_exc()}')
-        finally:
-            if not websocket.closed:
-                await websocket.close()
+            await send(protocol.error_frame(request_id, f'未知异常 {e}'))
+
+    await send(protocol.done_frame(request_id))
 
 
 def parse_params(obj):
@@ -76,7 +115,7 @@ class FillPubsContext:
         config = self.config
         config.logger = logger
         try:
-            browser = await nodriver_tool.create(logger)
+            browser = await get_pool(logger).acquire()  # 从浏览器池租借
         except Exception as e:
             logger.error(e)
             raise ErrorToTell(f'nodriver启动浏览器出错 {e}')
@@ -85,11 +124,10 @@ class FillPubsContext:
         return FillPubsAbstract(self.config)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        logger = self.config.logger
         if self.config.browser:
+            logger = self.config.logger
             try:
-                browser = self.config.browser
-                browser.stop()  # 标准关闭
-                logger.info('已关闭浏览器')
+                get_pool(logger).release(self.config.browser)  # 归还，不关闭
+                logger.info('已归还浏览器')
             except Exception as e:
-                logger.info('关闭浏览器异常 ' + traceback.format_exc())
+                logger.info('归还浏览器异常 ' + traceback.format_exc())
@@ -1,5 +1,6 @@
 import asyncio
 
+from tools.llm_cache import fingerprint, get_llm_cache
 from tools.llm_tools import ask_gpt_async
 
 
@@ -13,10 +14,18 @@ class AskGpt:
     class GPTAnswerError(Exception):
         pass
 
-    async def ask_gpt(self, query_txt):
+    async def ask_gpt(self, query_txt, max_tokens=None, timeout=None):
+        """
+        相同提问优先取缓存，同时进行的相同提问合并为一次请求
+        :param timeout: 本次的时限，默认 self.timeout
+        """
+        key = fingerprint(query_txt, max_tokens=max_tokens)
+        return await get_llm_cache().get_or_call(key, lambda: self._ask_gpt(query_txt, max_tokens, timeout))
+
+    async def _ask_gpt(self, query_txt, max_tokens=None, timeout=None):
         try:
             # logger.debug(f'ask_gpt_async 的 timeout 为 {self.timeout}')
-            ans = await ask_gpt_async(query_txt, self.timeout)
+            ans = await ask_gpt_async(query_txt, timeout or self.timeout, max_tokens=max_tokens)
         except asyncio.CancelledError:
             raise
         except Exception as e:
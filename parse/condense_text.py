@@ -0,0 +1,89 @@
+import re
+
+from tools.metric_tool import metrics
+
+_ABSTRACT_HEADING = re.compile(r'^(abstract|summary|摘要)\s*[:：]?$', re.I)
+_ABSTRACT_META = ('citation_abstract', 'dc.description', 'description', 'og:description', 'twitter:description')
+
+
+def estimate_tokens(text):
+    """粗略估计：中日韩字符每字一个，其余约4个字符一个"""
+    cjk = len(re.findall(r'[　-鿿가-힯]', text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def words(text):
+    return set(re.findall(r'[a-z0-9]{3,}', text.lower()))
+
+
+def meta_blocks(root):
+    """
+    :return: 可能含有摘要的meta标签内容
+    """
+    blocks = []
+    for tag in root.find_all('meta'):
+        name = (tag.get('name') or tag.get('property') or '').lower()
+        content = (tag.get('content') or '').strip()
+        if name in _ABSTRACT_META and content:
+            blocks.append(content)
+    return blocks
+
+
+def score_blocks(blocks, cut):
+    """
+    按与摘要片段的词重合度打分，"Abstract"标题之后的几段加分
+    """
+    cut_words = words(str(cut or ''))
+    scores = []
+    after_heading = 0
+    for block in blocks:
+        block_words = words(block)
+        score = len(cut_words & block_words) / len(cut_words) if cut_words else 0.0
+        if after_heading:
+            score += 0.5
+            after_heading -= 1
+        if _ABSTRACT_HEADING.match(block):
+            score += 1.0
+            after_heading = 3
+        scores.append(score)
+    return scores
+
+
+def condense_blocks(root, blocks, cut, budget):
+    """
+    网页文本超过token预算时，只保留与摘要最相关的文本块（保持原有顺序）；不记录指标，可在子进程中调用
+    :param blocks: extract_blocks 得到的文本块
+    :return: (压缩后的文本, 原token数, 压缩后token数)
+    """
+    full_txt = '\n'.join(blocks)
+    full_tokens = estimate_tokens(full_txt)
+    if full_tokens <= budget:
+        return full_txt, full_tokens, full_tokens
+
+    metas = meta_blocks(root)
+    scores = score_blocks(blocks, cut)
+    # 高分块及其相邻块优先，相邻块保留上下文
+    ranked = sorted(range(len(blocks)), key=lambda i: -max(
+        scores[i],
+        0.5 * scores[i - 1] if i > 0 else 0.0,
+        0.5 * scores[i + 1] if i + 1 < len(blocks) else 0.0,
+    ))
+
+    used = sum(estimate_tokens(m) for m in metas)
+    keep = set()
+    for i in ranked:
+        tokens = estimate_tokens(blocks[i])
+        if used + tokens > budget:
+            continue
+        keep.add(i)
+        used += tokens
+
+    condensed = '\n'.join(metas + [blocks[i] for i in sorted(keep)])
+    return condensed, full_tokens, estimate_tokens(condensed)
+
+
+def record_saved(full_tokens, tokens):
+    """记录压缩节省的token数"""
+    if full_tokens > tokens:
+        metrics.incr('gpt_tokens_saved', full_tokens - tokens)
+        metrics.observe('gpt_tokens_saved_per_request', full_tokens - tokens)
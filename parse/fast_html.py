@@ -0,0 +1,42 @@
+"""
+网页解析的公共入口：有 lxml 时用 lxml（C实现，比 html.parser 快数倍），否则退回 html.parser
+"""
+import re
+
+from bs4 import BeautifulSoup, Comment
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+_SKIP_TAGS = ('script', 'style', 'noscript', 'template')  # 不可见的文本
+
+
+def make_soup(html_str) -> BeautifulSoup:
+    """代替 BeautifulSoup(html_str, 'html.parser')"""
+    return BeautifulSoup(html_str, 'lxml' if lxml is not None else 'html.parser')
+
+
+def extract_blocks(root):
+    """
+    :param root: BeautifulSoup根节点
+    :return: 可见文本结点（去掉js、css、noscript、template、注释）
+    """
+    # 获取纯文本内容
+    web_str = []
+    for tag in root.find_all(string=True):  # 遍历所有文本结点
+        # 筛选标签
+        if tag.parent.name in _SKIP_TAGS or isinstance(tag, Comment):  # 过滤不可见文本、注释
+            continue
+
+        s = tag.strip()  # 不再是标签
+        if s:
+            web_str.append(s)
+
+    return web_str
+
+
+def title_words(title):
+    # 使用正则表达式分割字符串，保留字母、数字、连字符和下划线
+    return [word.lower() for word in re.split(r'[^a-zA-Z0-9_-]+', title) if word]
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import re
+
+from data import api_config
+from parse.AskGpt import AskGpt
+from tools.metric_tool import metrics
+
+
+class BatchItem:
+    def __init__(self, cut, web_txt, single, timeout=None):
+        loop = asyncio.get_running_loop()
+        self.cut = cut
+        self.web_txt = web_txt
+        self.single = single  # 单独请求的协程函数 single(timeout)，批量失败时使用
+        self.deadline = loop.time() + timeout if timeout else None  # 合并等待、合并请求和单独请求共用
+        self.future = loop.create_future()
+
+    def remaining(self):
+        """
+        :return: 剩余秒数，不限时为None
+        """
+        if self.deadline is None:
+            return None
+        return self.deadline - asyncio.get_running_loop().time()
+
+
+def parse_batch_answer(ans):
+    """
+    :return: {编号: 摘要}，无法解析时抛出ValueError
+    """
+    m = re.search(r'\{.*\}', ans, re.S)  # 去掉 ```json 等包裹
+    if m is None:
+        raise ValueError('回答中没有json')
+    obj = json.loads(m.group())
+    if not isinstance(obj, dict):
+        raise ValueError('回答不是json对象')
+    return {str(k): v for k, v in obj.items()}
+
+
+class GptBatcher(AskGpt):
+    """
+    在短时间窗口内收集多篇网页文本，合并为一次GPT请求，按编号取回各篇摘要；
+    解析失败或缺少编号的，退回单独请求。
+    窗口随到达间隔调整：预计窗口内不会有其他文献到达时立即发出，不白白等待
+    """
+    def __init__(self, size, window, max_chars, item_tokens, timeout=None):
+        super().__init__(timeout)
+        self.size = size
+        self.window = window
+        self.max_chars = max_chars
+        self.item_tokens = item_tokens
+        self._pending = []
+        self._pending_chars = 0
+        self._timer = None
+        self._tasks = set()
+        self._last_arrival = None
+        self._interval = None  # 到达间隔的指数平均
+
+    async def submit(self, cut, web_txt, single, timeout=None):
+        """
+        :param single: 单独请求的协程函数 single(timeout)
+        :param timeout: 该篇在GPT上的总时限，合并请求和失败后的单独请求都在其内
+        :return: 摘要
+        """
+        if self.size <= 1 or len(web_txt) >= self.max_chars:
+            return await single(timeout)
+
+        item = BatchItem(cut, web_txt, single, timeout)
+        self._pending.append(item)
+        self._pending_chars += len(web_txt)
+        wait = self._wait_time()
+        if len(self._pending) >= self.size or self._pending_chars >= self.max_chars or wait <= 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(wait, self._flush)
+
+        try:
+            return await item.future
+        finally:
+            if item in self._pending:  # 取消时尚未发出
+                self._pending.remove(item)
+                self._pending_chars -= len(web_txt)
+
+    def _wait_time(self):
+        """
+        记录本次到达，估计凑满一批还需等待的时间，不超过 window；预计窗口内没有下一篇时为0
+        """
+        now = asyncio.get_running_loop().time()
+        if self._last_arrival is not None:
+            gap = min(now - self._last_arrival, 10 * self.window)  # 空闲后尽快恢复
+            self._interval = gap if self._interval is None else 0.7 * self._interval + 0.3 * gap
+        self._last_arrival = now
+
+        if self._interval is None or self._interval > self.window:
+            metrics.incr('gpt_batch_no_wait')
+            return 0.0
+        return min(self.window, self._interval * (self.size - len(self._pending)))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_chars = self._pending, [], 0
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        if len(batch) == 1:
+            await self._run_single(batch)
+            return
+
+        metrics.incr('gpt_batch_requests')
+        metrics.incr('gpt_batch_items', len(batch))
+        failed = batch
+        try:
+            ans = await self.ask_gpt(self.build_query(batch), max_tokens=self.item_tokens * len(batch),
+                                     timeout=self.batch_timeout(batch))
+            answers = parse_batch_answer(ans)
+            failed = []
+            for i, item in enumerate(batch, 1):
+                abstract = answers.get(str(i), '')
+                if item.future.done():
+                    continue
+                if abstract is None:  # 网页中没有摘要，不再单独询问
+                    item.future.set_exception(self.GPTAnswerError('GPT回答网页中没有摘要'))
+                elif isinstance(abstract, str) and abstract.strip():
+                    item.future.set_result(abstract.strip())
+                else:  # 缺少编号或格式不对
+                    failed.append(item)
+        except asyncio.CancelledError:
+            raise
+        except (self.GPTQueryError, self.GPTAnswerError, ValueError):
+            pass
+
+        if failed:
+            metrics.incr('gpt_batch_fallback', len(failed))
+            await self._run_single(failed)
+
+    def batch_timeout(self, batch):
+        """合并请求的时限：不超过 self.timeout，也不超过其中最早到期的一篇"""
+        remaining = [r for r in (item.remaining() for item in batch) if r is not None]
+        timeouts = [t for t in [self.timeout, *remaining] if t is not None]
+        return max(0.1, min(timeouts)) if timeouts else None
+
+    async def _run_single(self, items):
+        async def run(item):
+            if item.future.done():
+                return
+            remaining = item.remaining()
+            if remaining is not None and remaining <= 0:
+                item.future.set_exception(self.GPTQueryError('访问GPT超时，合并请求已用完时限'))
+                return
+            try:
+                result = await item.single(remaining)
+            except Exception as e:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            else:
+                if not item.future.done():
+                    item.future.set_result(result)
+
+        await asyncio.gather(*[run(item) for item in items])
+
+    @staticmethod
+    def build_query(batch):
+        lines = [
+            '以下有多篇文章/出版物，每篇给出编号、一段不完整的摘要和该文章的网页内容。',
+            '请分别从各篇的网页内容中找出完整的摘要，以英文输出；',
+            '只回答一个json对象，键为编号，值为摘要，找不到时为null，不要输出其他内容',
+        ]
+        for i, item in enumerate(batch, 1):
+            lines += [
+                f'### 编号 {i}',
+                '不完整的摘要：', str(item.cut),
+                '网页内容：', item.web_txt,
+            ]
+        return '\n'.join(lines)
+
+
+_batcher = None
+
+
+def get_batcher() -> GptBatcher:
+    """进程内共用"""
+    global _batcher
+    if _batcher is None:
+        _batcher = GptBatcher(
+            size=getattr(api_config, 'gpt_batch_size', 4),
+            window=getattr(api_config, 'gpt_batch_window', 1.5),
+            max_chars=getattr(api_config, 'gpt_batch_max_chars', 40000),
+            item_tokens=getattr(api_config, 'gpt_batch_item_tokens', 512),
+            timeout=getattr(api_config, 'gpt_batch_timeout', 90),
+        )
+    return _batcher
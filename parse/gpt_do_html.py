@@ -4,7 +4,8 @@ from parse.AskGpt import AskGpt
 
 
 class GptDoHtml(AskGpt):
-    def __init__(self, logger):
+    def __init__(self, logger, timeout=60):
+        super().__init__(timeout)
         self.logger = logger
 
     async def get_abstract(self, html_str):
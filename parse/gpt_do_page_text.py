@@ -1,24 +1,11 @@
 import traceback
 
-from bs4 import BeautifulSoup, Comment
-
+from data import api_config
 from parse.AskGpt import AskGpt
-
-
-def extract_text(root):
-    # 获取纯文本内容
-    web_str = []
-    for tag in root.find_all(string=True):  # 遍历所有文本结点
-        # 筛选标签
-        if tag.parent.name in ('script', 'style',) or isinstance(tag, Comment):  # 过滤js,css,注释
-            continue
-
-        s = tag.strip()  # 不再是标签
-        if s:
-            web_str.append(s)
-
-    web_txt = '\n'.join(web_str)  # 用换行隔开
-    return web_txt
+from parse.condense_text import record_saved
+from parse.gpt_batch import get_batcher
+from parse.parse_jobs import page_text
+from parse.parse_service import get_parse_service
 
 
 class GptDoPageText(AskGpt):
@@ -26,8 +13,18 @@ class GptDoPageText(AskGpt):
         super().__init__(timeout)
 
     async def get_abstract(self, cut, html_str):
-        root = BeautifulSoup(html_str, 'html.parser')
-        web_txt = extract_text(root)
+        # 解析网页（较大时在子进程中），控制在token预算内
+        budget = getattr(api_config, 'gpt_text_token_budget', 3000)
+        web_txt, full_tokens, tokens = await get_parse_service().run(page_text, html_str, cut, budget)
+        record_saved(full_tokens, tokens)
+        return await self.get_abstract_from_text(cut, web_txt)
+
+    async def get_abstract_from_text(self, cut, web_txt):
+        # 与同时进行的其他文献合并请求，失败时单独请求；合并和单独请求共用 self.timeout
+        return await get_batcher().submit(cut, web_txt, lambda timeout: self.ask_abstract(cut, web_txt, timeout),
+                                          timeout=self.timeout)
+
+    async def ask_abstract(self, cut, web_txt, timeout=None):
         query_txt = '\n'.join([
             '以下是一段不完整的摘要：', str(cut),
             '以下是该文章/出版物的网页内容：', web_txt,
@@ -47,5 +44,5 @@ class GptDoPageText(AskGpt):
         #     ans
         # ]))
 
-        ans = await self.ask_gpt(query_txt)
+        ans = await self.ask_gpt(query_txt, timeout=timeout)
         return ans
@@ -1,7 +1,7 @@
 import re
 
 from tools.html_tools import merge_xpath, get_xpath
-from tools.llm_tools import ask_gpt
+from parse.AskGpt import AskGpt
 
 
 def look_at_page(root):
@@ -26,13 +26,13 @@ def look_at_page(root):
     return web_str, web_tag
 
 
-def query_gpt(web_str):
+async def query_gpt(web_str):
     web_txt = '\n'.join([f"文字片段{i}：{s}" for i, s in enumerate(web_str)])  # more close for gpt
     query = '\n'.join([
         '以下是一篇文章/出版物的网页文字片段：', web_txt,
         '请找出摘要或概述性内容对应文字片段，请以列表输出'
     ])
-    return ask_gpt(query)
+    return await AskGpt(timeout=60).ask_gpt(query)
 
 
 def parse_number(answer):
@@ -42,14 +42,14 @@ def parse_number(answer):
     return numbers
 
 
-def get_xpath_by_gpt(root):
+async def get_xpath_by_gpt(root):
     """
     :param root: bs4标签
     :return:
     """
     # 获取文字片段
     web_str, web_tag = look_at_page(root)
-    ans = query_gpt(web_str)
+    ans = await query_gpt(web_str)
     xpaths = []
     # 提取GPT回答中的数字
     for number in parse_number(ans):
@@ -1,11 +1,13 @@
-from bs4 import BeautifulSoup
-
+from parse.fast_html import make_soup
 from tools.html_tools import find_tag
 
 
 class HTMLParse:
-    def __init__(self, html_str):
-        self.root = BeautifulSoup(html_str, "html.parser")
+    def __init__(self, html_str=None, root=None):
+        """
+        :param root: 已解析的网页，提供时不再解析html_str
+        """
+        self.root = root if root is not None else make_soup(html_str)
 
     def get_texts(self, xpaths):
         """
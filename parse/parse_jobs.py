@@ -0,0 +1,51 @@
+"""
+解析网页的纯函数，参数和结果都可序列化，可交给 parse_service 在子进程中执行
+"""
+from parse.condense_text import condense_blocks
+from parse.fast_html import make_soup, extract_blocks
+from parse.parse_html import HTMLParse
+from parse.rule_abstract import extract_abstract
+from tools.html_tools import find_tag_by_text, get_xpath
+
+
+def page_text(html_str, cut, budget):
+    """
+    :return: (压缩后的网页文本, 原token数, 压缩后token数)
+    """
+    root = make_soup(html_str)
+    return condense_blocks(root, extract_blocks(root), cut, budget)
+
+
+def analyze_page(html_str, cut, budget, xpaths=None):
+    """
+    一次解析，完成规则提取、按xpath提取和文本压缩
+    :param xpaths: 已记录的同类网页xpath
+    """
+    root = make_soup(html_str)
+    blocks = extract_blocks(root)
+    rule_abstract, rule_score = extract_abstract(root, blocks, cut)
+
+    xpath_text = None
+    if xpaths:
+        try:
+            xpath_text = '\n'.join(HTMLParse(root=root).get_texts(xpaths)).strip()
+        except Exception:
+            pass
+
+    web_txt, full_tokens, tokens = condense_blocks(root, blocks, cut, budget)
+    return {
+        'rule_abstract': rule_abstract,
+        'rule_score': rule_score,
+        'xpath_text': xpath_text,
+        'web_txt': web_txt,
+        'full_tokens': full_tokens,
+        'tokens': tokens,
+    }
+
+
+def locate_xpath(html_str, text):
+    """
+    :return: 包含该段文字的最小标签的xpath，找不到时返回None
+    """
+    tag = find_tag_by_text(make_soup(html_str), text)
+    return get_xpath(tag) if tag is not None else None
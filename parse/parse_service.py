@@ -0,0 +1,92 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from data import api_config
+from tools.metric_tool import metrics
+
+
+class ParseCrashError(Exception):
+    pass
+
+
+class ParseService:
+    """
+    在进程池中解析网页，避免阻塞事件循环；
+    较小的网页直接在当前线程解析，排队数有上限（超出时等待）
+    """
+    def __init__(self, workers, max_pending, inline_below):
+        self.workers = workers
+        self.inline_below = inline_below
+        self._slots = asyncio.Semaphore(max_pending)
+        self._pending = 0
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn 避免 fork 继承事件循环和线程锁
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    async def run(self, fn, html_str, *args):
+        """
+        :param fn: 模块级函数 fn(html_str, *args)，结果须可序列化
+        :return: 子进程重试后仍异常退出时抛出 ParseCrashError
+        """
+        if self.workers <= 0 or len(html_str) < self.inline_below:
+            metrics.incr('parse_inline')
+            return fn(html_str, *args)
+
+        async with self._slots:
+            self._pending += 1
+            metrics.gauge('parse_pending', self._pending)
+            try:
+                with metrics.timer('parse_offload_sec'):
+                    result = await self._offload(fn, html_str, *args)
+                metrics.incr('parse_offloaded')
+                return result
+            finally:
+                self._pending -= 1
+                metrics.gauge('parse_pending', self._pending)
+
+    async def _offload(self, fn, html_str, *args):
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                return await loop.run_in_executor(pool, fn, html_str, *args)
+            except BrokenProcessPool:
+                # 子进程异常退出（崩溃或内存不足），不在当前进程解析同一网页；重建进程池后再试一次
+                metrics.incr('parse_pool_broken')
+                if self._pool is pool:  # 同时失败的其他解析已重建时不再重建
+                    self._pool = None
+                    pool.shutdown(wait=False, cancel_futures=True)
+        raise ParseCrashError(f'解析网页时子进程异常退出 {fn.__name__} 长度{len(html_str)}')
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_service = None
+
+
+def get_parse_service() -> ParseService:
+    global _service
+    if _service is None:
+        workers = getattr(api_config, 'parse_workers', 2)
+        _service = ParseService(
+            workers,
+            max_pending=getattr(api_config, 'parse_max_pending', max(1, workers) * 4),
+            inline_below=getattr(api_config, 'parse_inline_below', 100000),
+        )
+    return _service
+
+
+def stop_parse_service():
+    global _service
+    if _service is not None:
+        _service.shutdown()
+        _service = None
@@ -0,0 +1,107 @@
+import json
+import re
+
+# meta标签及其可信度
+_META_WEIGHT = {
+    'citation_abstract': 0.9,
+    'dc.description': 0.75,
+    'dcterms.abstract': 0.9,
+    'description': 0.55,
+    'og:description': 0.55,
+    'twitter:description': 0.5,
+}
+_MIN_LENGTH = 100  # 过短的不是完整摘要
+_BLOCK_MIN_RATIO = 1.5  # 文本块至少为摘要片段的倍数，才可能不经GPT采用
+
+
+def normalize(text):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+def cut_prefix(cut, n=60):
+    """谷歌学术的摘要片段通常以省略号结尾，取开头部分用于匹配"""
+    cut = normalize(re.sub(r'(…|\.\.\.)\s*$', '', str(cut or '')))
+    return cut[:n]
+
+
+def meta_candidates(root):
+    for tag in root.find_all('meta'):
+        name = (tag.get('name') or tag.get('property') or '').lower()
+        content = (tag.get('content') or '').strip()
+        if name in _META_WEIGHT and content:
+            yield content, _META_WEIGHT[name]
+
+
+def json_ld_candidates(root):
+    for tag in root.find_all('script', type='application/ld+json'):
+        try:
+            obj = json.loads(tag.string or '')
+        except ValueError:
+            continue
+        for node in obj if isinstance(obj, list) else [obj]:
+            if not isinstance(node, dict):
+                continue
+            for key, weight in (('abstract', 0.9), ('description', 0.7)):
+                value = node.get(key)
+                if isinstance(value, str) and value.strip():
+                    yield value.strip(), weight
+
+
+def block_candidates(blocks, prefix, cut):
+    """以摘要片段开头或包含摘要片段的网页文本块"""
+    for block in blocks:
+        norm = normalize(block)
+        if norm.startswith(prefix):
+            weight = 0.85
+        elif prefix in norm:
+            weight = 0.65
+        else:
+            continue
+        # 摘要分为多段时，开头一段可能只比片段稍长，不能当作完整摘要
+        if len(block) < _BLOCK_MIN_RATIO * len(str(cut or '')):
+            weight = min(weight, 0.6)
+        yield block, weight
+
+
+def confidence(text, weight, cut, prefix):
+    """
+    :return: 0~1，与摘要片段越吻合越高
+    """
+    if len(text) < max(_MIN_LENGTH, len(str(cut or '')) - 10) or text.rstrip().endswith(('…', '...')):
+        return 0.0
+    if not prefix:
+        return weight * 0.8
+    norm = normalize(text)
+    if norm.startswith(prefix):
+        return min(1.0, weight + 0.1)
+    if prefix in norm:
+        return weight
+    return weight * 0.5
+
+
+def extract_abstract(root, blocks, cut):
+    """
+    不经GPT，从meta标签、JSON-LD和以摘要片段开头的文本块中找摘要
+    :param blocks: extract_blocks 得到的文本块
+    :return: (摘要, 可信度)，找不到时为 (None, 0.0)
+    """
+    prefix = cut_prefix(cut)
+    best, best_score = None, 0.0
+    candidates = [*meta_candidates(root), *json_ld_candidates(root)]
+    if prefix:
+        candidates += block_candidates(blocks, prefix, cut)
+    for text, weight in candidates:
+        score = confidence(text, weight, cut, prefix)
+        if score > best_score:
+            best, best_score = text, score
+    return best, best_score
+
+
+def matches_cut(text, cut):
+    """
+    :return: 文字是否像是该文献的完整摘要（包含摘要片段的开头，且不过短）；摘要片段无法比对时为False
+    """
+    if not text or len(text) < _MIN_LENGTH:
+        return False
+    prefix = cut_prefix(cut)
+    return bool(prefix) and prefix in normalize(text)
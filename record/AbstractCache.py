@@ -0,0 +1,42 @@
+from data import api_config
+from record.SqliteCache import SqliteCache
+from tools.metric_tool import metrics
+from tools.pub_key_tools import pub_keys
+
+
+class AbstractCache:
+    """
+    跨查询的摘要缓存，以谷歌学术id、网址、标题+第一作者查找
+    """
+    def __init__(self, path, ttl, max_items):
+        self.store = SqliteCache(path, 'abstract', max_items=max_items, default_ttl=ttl)
+
+    async def get(self, pub):
+        """
+        :return: 摘要，未缓存时返回None
+        """
+        keys = pub_keys(pub)
+        if not keys:
+            return None
+        abstract = await self.store.aget_first(keys)
+        metrics.incr('abstract_cache_hit' if abstract else 'abstract_cache_miss')
+        return abstract
+
+    async def put(self, pub, abstract):
+        keys = pub_keys(pub)
+        if keys and abstract:
+            await self.store.aset_many(keys, abstract)
+
+
+_cache = None
+
+
+def get_abstract_cache() -> AbstractCache:
+    global _cache
+    if _cache is None:
+        _cache = AbstractCache(
+            getattr(api_config, 'abstract_cache_path', 'data/cache/abstract.sqlite3'),
+            ttl=getattr(api_config, 'abstract_cache_ttl', 30 * 24 * 3600),
+            max_items=getattr(api_config, 'abstract_cache_max_items', 100000),
+        )
+    return _cache
@@ -0,0 +1,70 @@
+from data import api_config
+from record.SqliteCache import SqliteCache
+from tools.metric_tool import metrics
+from tools.pub_key_tools import get_scholar_id, pub_keys
+
+
+class BibtexCache:
+    """
+    跨查询的BibTeX缓存，以谷歌学术id（scholarly的url_scholarbib，serpdog的id）查找，没有id时用网址或标题；
+    永久性失败也记录下来（较短的有效期），避免重复请求
+    """
+    def __init__(self, path, ttl, negative_ttl, max_items):
+        self.store = SqliteCache(path, 'bibtex', max_items=max_items, default_ttl=ttl)
+        self.negative_ttl = negative_ttl
+
+    @staticmethod
+    def keys(pub):
+        """
+        :return: 谷歌学术id优先；没有时（常见于无 url_scholarbib 的文献）用规范化网址、标题加第一作者
+        """
+        keys = []
+        scholar_id = get_scholar_id(pub)
+        if scholar_id:
+            keys.append(f'scholar:{scholar_id}')
+        url_scholarbib = (pub.get('raw_pub') or {}).get('url_scholarbib')
+        if url_scholarbib:
+            keys.append(f'bib:{url_scholarbib}')
+        keys.extend(key for key in pub_keys(pub) if not key.startswith('scholar:'))
+        return keys
+
+    async def get(self, pub):
+        """
+        :return: {'link', 'string'}，或失败记录 {'error'}，未缓存时返回None
+        """
+        keys = self.keys(pub)
+        value = await self.store.aget_first(keys) if keys else None
+        if value is None:
+            metrics.incr('bibtex_cache_miss')
+        elif 'error' in value:
+            metrics.incr('bibtex_cache_negative_hit')
+        else:
+            metrics.incr('bibtex_cache_hit')
+        metrics.gauge('bibtex_cache_hit_rate', metrics.ratio('bibtex_cache_hit', 'bibtex_cache_miss'))
+        return value
+
+    async def put(self, pub, bibtex):
+        keys = self.keys(pub)
+        if keys and bibtex.get('string'):
+            await self.store.aset_many(keys, bibtex)
+
+    async def put_failure(self, pub, error):
+        """记录永久性失败"""
+        keys = self.keys(pub)
+        if keys:
+            await self.store.aset_many(keys, {'error': str(error)}, ttl=self.negative_ttl)
+
+
+_cache = None
+
+
+def get_bibtex_cache() -> BibtexCache:
+    global _cache
+    if _cache is None:
+        _cache = BibtexCache(
+            getattr(api_config, 'bibtex_cache_path', 'data/cache/bibtex.sqlite3'),
+            ttl=getattr(api_config, 'bibtex_cache_ttl', 180 * 24 * 3600),
+            negative_ttl=getattr(api_config, 'bibtex_cache_negative_ttl', 24 * 3600),
+            max_items=getattr(api_config, 'bibtex_cache_max_items', 100000),
+        )
+    return _cache
@@ -1,4 +1,5 @@
 from record.Conn import Conn
+from tools.event_tool import Notifier
 from tools.bib_tools import add_abstract
 
 
@@ -8,15 +9,18 @@ class Record2(Conn):
         self.pages = None
         self.fail_pubs = []
         self.filled_pubs = []
+        self.notifier = Notifier()  # 进度变化通知
 
     def set_pages(self, pages):
         self.pages = pages
 
     def fail_to_fill(self, pub):
         self.fail_pubs.append(pub)
+        self.notifier.notify()
 
     def success_fill(self, pub):
         self.filled_pubs.append(pub)
+        self.notifier.notify()
 
     def get_progress(self):
         if not self.pages:
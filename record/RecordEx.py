@@ -1,30 +1,106 @@
-from Conn import Conn
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+from data import api_config
+from record.Conn import Conn
+
+
+def url_pattern(url):
+    """
+    同类网页的网址模式：域名 + 路径，含数字的路径段视为变量
+    例如 https://www.sciencedirect.com/science/article/pii/S0001 -> sciencedirect.com/science/article/pii/*
+    """
+    parts = urlsplit(url)
+    domain = parts.netloc.lower()
+    if domain.startswith('www.'):
+        domain = domain[4:]
+    segments = ['*' if re.search(r'\d', seg) else seg for seg in parts.path.split('/') if seg]
+    return '/'.join([domain] + segments[:4])
 
 
 class RecordEx(Conn):
+    """
+    按网址模式保存摘要所在的xpath，供同类网页直接提取；
+    连续多次提取失败后停用，等待重新学习
+    """
+    def __init__(self, logger, path=None, max_misses=None):
+        super().__init__(logger)
+        path = path or getattr(api_config, 'xpath_store_path', 'data/cache/xpath.sqlite3')
+        self.max_misses = max_misses or getattr(api_config, 'xpath_max_misses', 3)
+        self.pubs = []
+
+        dir_name = os.path.dirname(path)
+        if dir_name and not os.path.exists(dir_name):
+            os.makedirs(dir_name, exist_ok=True)
+        self._lock = threading.Lock()  # 在线程池中调用
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS xpath ('
+                              'pattern TEXT PRIMARY KEY, domain TEXT, xpaths TEXT, '
+                              'success INTEGER DEFAULT 0, failure INTEGER DEFAULT 0, '
+                              'misses INTEGER DEFAULT 0, disabled INTEGER DEFAULT 0, updated REAL)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS xpath_domain ON xpath (domain)')
+
     def search_history(self, url):
         """
         :param url: 寻找与url最相近的网址
         :return: base_url，若未找到返回None
         """
+        pattern = url_pattern(url)
+        domain = pattern.split('/')[0]
+        with self._lock:
+            row = self.conn.execute('SELECT pattern FROM xpath WHERE pattern = ? AND disabled = 0 '
+                                    'AND xpaths IS NOT NULL', (pattern,)).fetchone()
+            if row is None:
+                # 同一网站下最可靠的模式
+                row = self.conn.execute('SELECT pattern FROM xpath WHERE domain = ? AND disabled = 0 '
+                                        'AND xpaths IS NOT NULL ORDER BY success - failure DESC LIMIT 1',
+                                        (domain,)).fetchone()
+        return row[0] if row else None
 
     def get_xpaths(self, base_url):
         """
         :param base_url: 查询此类网页的xpath
         :return:
         """
+        with self._lock:
+            row = self.conn.execute('SELECT xpaths FROM xpath WHERE pattern = ?', (base_url,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else []
+
+    def success_xpaths(self, base_url):
+        """
+        :param base_url: 此类网页的xpath提取成功
+        """
+        with self._lock, self.conn:
+            self.conn.execute('UPDATE xpath SET success = success + 1, misses = 0, updated = ? '
+                              'WHERE pattern = ?', (time.time(), base_url))
 
     def disable_xpaths(self, base_url):
         """
-        :param base_url: 此类网页的xpath不可用了
+        :param base_url: 此类网页的xpath不可用了，连续 max_misses 次后停用
         :return:
         """
+        with self._lock, self.conn:
+            self.conn.execute('UPDATE xpath SET failure = failure + 1, misses = misses + 1, '
+                              'disabled = (misses + 1 >= ?), updated = ? WHERE pattern = ?',
+                              (self.max_misses, time.time(), base_url))
 
     def fail_to_handle(self, url):
         """
         :param url: 记录该网页无法处理
         :return:
         """
+        pattern = url_pattern(url)
+        with self._lock, self.conn:
+            self.conn.execute('INSERT INTO xpath (pattern, domain, failure, updated) VALUES (?, ?, 1, ?) '
+                              'ON CONFLICT(pattern) DO UPDATE SET failure = failure + 1, updated = excluded.updated',
+                              (pattern, pattern.split('/')[0], time.time()))
 
     def new_handled(self, url, xpaths):
         """
@@ -32,9 +108,27 @@ class RecordEx(Conn):
         :param xpaths:
         :return:
         """
+        pattern = url_pattern(url)
+        with self._lock, self.conn:
+            self.conn.execute('INSERT INTO xpath (pattern, domain, xpaths, success, updated) VALUES (?, ?, ?, 1, ?) '
+                              'ON CONFLICT(pattern) DO UPDATE SET xpaths = excluded.xpaths, success = success + 1, '
+                              'misses = 0, disabled = 0, updated = excluded.updated',
+                              (pattern, pattern.split('/')[0], json.dumps(xpaths), time.time()))
 
     def save_pub(self, pub):
         """
         :param pub: 保存此结果
         :return:
-        """
\ No newline at end of file
+        """
+        self.pubs.append(pub)
+
+
+_store = None
+
+
+def get_xpath_store(logger) -> RecordEx:
+    """进程内共用，多个子结点进程共用同一个数据库文件"""
+    global _store
+    if _store is None:
+        _store = RecordEx(logger)
+    return _store
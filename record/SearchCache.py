@@ -0,0 +1,43 @@
+from data import api_config
+from record.SqliteCache import SqliteCache
+from tools.metric_tool import metrics
+
+
+class SearchCache:
+    """
+    搜索结果的分页缓存，以（来源, 关键词, 年份范围, 页码）查找，
+    重复或有重叠的查询只需获取缺少的页
+    """
+    def __init__(self, path, ttl, max_items):
+        self.store = SqliteCache(path, 'search_page', max_items=max_items, default_ttl=ttl)
+
+    @staticmethod
+    def key(backend, name, year_low, year_high, page):
+        name = ' '.join(name.lower().split())
+        return f'{backend}:{name}|{year_low}|{year_high}|{page}'
+
+    async def get(self, backend, name, year_low, year_high, page):
+        """
+        :return: 该页的文献列表，未缓存或已过期时返回None
+        """
+        pubs = await self.store.aget_first([self.key(backend, name, year_low, year_high, page)])
+        metrics.incr('search_cache_hit' if pubs is not None else 'search_cache_miss')
+        return pubs
+
+    async def put(self, backend, name, year_low, year_high, page, pubs):
+        if pubs:
+            await self.store.aset_many([self.key(backend, name, year_low, year_high, page)], pubs)
+
+
+_cache = None
+
+
+def get_search_cache() -> SearchCache:
+    global _cache
+    if _cache is None:
+        _cache = SearchCache(
+            getattr(api_config, 'search_cache_path', 'data/cache/search.sqlite3'),
+            ttl=getattr(api_config, 'search_cache_ttl', 24 * 3600),
+            max_items=getattr(api_config, 'search_cache_max_items', 20000),
+        )
+    return _cache
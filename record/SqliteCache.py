@@ -0,0 +1,113 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class SqliteCache:
+    """
+    本地 SQLite 键值缓存，值以json保存，支持过期时间和LRU淘汰，可跨进程共用
+    """
+    def __init__(self, path, table, max_items=100000, default_ttl=None):
+        dir_name = os.path.dirname(path)
+        if dir_name and not os.path.exists(dir_name):
+            os.makedirs(dir_name, exist_ok=True)
+
+        self.table = table
+        self.max_items = max_items
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()  # 在线程池中调用
+        self._writes = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                              f'(key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL)')
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)')
+
+    def get(self, key):
+        """
+        :return: 值，不存在或已过期时返回None
+        """
+        now = time.time()
+        with self._lock, self.conn:
+            row = self.conn.execute(f'SELECT value, expires FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires = row
+            if expires is not None and expires < now:
+                self.conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                return None
+            self.conn.execute(f'UPDATE {self.table} SET accessed = ? WHERE key = ?', (now, key))
+        return json.loads(value)
+
+    def get_first(self, keys):
+        """
+        :return: 按顺序第一个命中的值
+        """
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                return value
+        return None
+
+    def set(self, key, value, ttl=None):
+        self.set_many([key], value, ttl)
+
+    def set_many(self, keys, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        expires = now + ttl if ttl else None
+        value = json.dumps(value, ensure_ascii=False)
+        with self._lock, self.conn:
+            self.conn.executemany(f'INSERT OR REPLACE INTO {self.table} (key, value, expires, accessed) '
+                                  f'VALUES (?, ?, ?, ?)', [(key, value, expires, now) for key in keys])
+            self._writes += len(keys)
+            if self._writes >= 100:  # 不必每次都检查数量
+                self._writes = 0
+                self._evict()
+
+    def update(self, key, fn, ttl=None):
+        """
+        在同一事务中读取并写入，多个进程同时更新时不会互相覆盖
+        :param fn: fn(旧值，不存在或已过期时为None) -> 新值
+        :return: 新值
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')  # 读之前加写锁
+            row = self.conn.execute(f'SELECT value, expires FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            old = json.loads(row[0]) if row is not None and (row[1] is None or row[1] >= now) else None
+            value = fn(old)
+            self.conn.execute(f'INSERT OR REPLACE INTO {self.table} (key, value, expires, accessed) '
+                              f'VALUES (?, ?, ?, ?)', (key, json.dumps(value, ensure_ascii=False),
+                                                       now + ttl if ttl else None, now))
+            self._writes += 1
+            if self._writes >= 100:
+                self._writes = 0
+                self._evict()
+        return value
+
+    def delete(self, key):
+        with self._lock, self.conn:
+            self.conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def _evict(self):
+        """删除过期的，再按最近访问时间淘汰超出数量的"""
+        self.conn.execute(f'DELETE FROM {self.table} WHERE expires IS NOT NULL AND expires < ?', (time.time(),))
+        count = self.conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        if count > self.max_items:
+            self.conn.execute(f'DELETE FROM {self.table} WHERE key IN '
+                              f'(SELECT key FROM {self.table} ORDER BY accessed LIMIT ?)', (count - self.max_items,))
+
+    async def aget_first(self, keys):
+        return await asyncio.to_thread(self.get_first, keys)
+
+    async def aset_many(self, keys, value, ttl=None):
+        await asyncio.to_thread(self.set_many, keys, value, ttl)
+
+    async def aupdate(self, key, fn, ttl=None):
+        return await asyncio.to_thread(self.update, key, fn, ttl)
@@ -0,0 +1,443 @@
+import asyncio
+import collections
+import itertools
+import os
+import sys
+import traceback
+from contextlib import aclosing
+from datetime import datetime
+
+import websockets
+
+from data import api_config
+from node import protocol
+from node.node_pipline import NODE_READY
+from tools.log_tool import create_logger
+from tools.metric_tool import metrics
+
+
+class NodeFleetError(Exception):
+    pass
+
+
+class NodeWorker:
+    """
+    一个常驻的 node 进程（自带浏览器池）及其连接，连接上可同时有多个请求
+    """
+    def __init__(self, index, logger):
+        self.index = index
+        self.logger = logger
+        self.process = None
+        self.websocket = None
+        self._ids = itertools.count()
+        self._pending = {}  # 请求id -> Future
+        self._reader = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def alive(self):
+        return (self.process is not None and self.process.returncode is None
+                and self.websocket is not None and not self.websocket.closed)
+
+    async def ensure_started(self):
+        async with self._lock:
+            if self.alive:
+                return
+            await self.stop()
+            self.logger.info(f'启动子结点 #{self.index}')
+            self.process, self.websocket = await create_node_process(self.logger, port=0)
+            self._reader = asyncio.create_task(self._read())
+
+    async def stream(self, pubs):
+        """
+        :return: 异步生成器，逐条产出该请求的 result/error/progress 消息，直到子结点告知结束；
+            中途退出时通知子结点取消
+        """
+        request_id = next(self._ids)
+        queue = asyncio.Queue()
+        self._pending[request_id] = queue
+        finished = False
+        try:
+            await self.websocket.send(protocol.fill_request(request_id, pubs))
+            while True:
+                frame = await queue.get()
+                if isinstance(frame, Exception):
+                    raise frame
+                if frame['type'] == 'done':
+                    finished = True
+                    return
+                yield frame
+        finally:
+            self._pending.pop(request_id, None)
+            if not finished and self.alive:
+                try:
+                    await self.websocket.send(protocol.cancel_request(request_id))
+                except websockets.exceptions.ConnectionClosed:
+                    pass
+
+    async def query_metrics(self, timeout=2):
+        """
+        :return: 子结点的指标 snapshot，子结点未运行或超时时返回None
+        """
+        if not self.alive:
+            return None
+        request_id = next(self._ids)
+        queue = asyncio.Queue()
+        self._pending[request_id] = queue
+        try:
+            await self.websocket.send(protocol.metrics_request(request_id))
+            frame = await asyncio.wait_for(queue.get(), timeout)
+        except (websockets.exceptions.ConnectionClosed, asyncio.TimeoutError):
+            return None
+        finally:
+            self._pending.pop(request_id, None)
+        if isinstance(frame, Exception) or frame['type'] != 'metrics':
+            return None
+        return frame['snapshot']
+
+    async def _read(self):
+        try:
+            async for message in self.websocket:
+                try:
+                    obj = protocol.loads(message)
+                except protocol.ProtocolError as e:
+                    self.logger.error(f'子结点 #{self.index} 消息无法解析 {e}')
+                    continue
+                queue = self._pending.get(obj['id'])
+                if queue is not None:
+                    queue.put_nowait(obj)
+        except websockets.exceptions.ConnectionClosed as e:
+            self.logger.error(f'子结点 #{self.index} 连接中断 {e}')
+        finally:
+            # 连接断开时，未完成的请求全部失败
+            for queue in self._pending.values():
+                queue.put_nowait(NodeFleetError(f'子结点 #{self.index} 连接已断开'))
+
+    async def stop(self):
+        if self.websocket is not None:
+            try:
+                await self.websocket.close()
+            except Exception as e:
+                self.logger.error(f'关闭子结点连接异常 {e}')
+            self.websocket = None
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        if self.process is not None:
+            await stop_node_process(self.process, self.logger)
+            self.process = None
+
+
+class NodeFleet:
+    """
+    管理多个 node 进程，逐篇分发：哪个子结点空闲，就由它取走排队中的文献
+    """
+    def __init__(self, logger, size, slots, batch=5, max_requeue=3):
+        """
+        :param size: 子结点进程数
+        :param slots: 每个子结点同时进行的请求数，每个请求租借一个浏览器
+        :param batch: 每个请求最多带的文献数（同一浏览器中同时打开的网页数）
+        :param max_requeue: 子结点重启失败时，同一篇重新排队的次数上限
+        """
+        self.logger = logger
+        self.workers = [NodeWorker(i, logger) for i in range(size)]
+        self.slots = slots
+        self.batch = batch
+        self.max_requeue = max_requeue
+        self._jobs = asyncio.Queue()
+        self._loops = []
+
+    async def start(self):
+        results = await asyncio.gather(*[w.ensure_started() for w in self.workers], return_exceptions=True)
+        started = [w for w, r in zip(self.workers, results) if not isinstance(r, BaseException)]
+        for w, r in zip(self.workers, results):
+            if isinstance(r, BaseException):
+                self.logger.error(f'子结点 #{w.index} 启动失败 {r}')
+        if not started:
+            raise NodeFleetError('所有子结点均启动失败')
+
+        for worker in started:  # 启动失败的子结点不取文献
+            for _ in range(self.slots):
+                self._loops.append(asyncio.create_task(self._work(worker)))
+        self.logger.info(f'子结点已启动 {len(started)}/{len(self.workers)}，'
+                         f'每个并发 {self.slots} 个请求、每个请求至多 {self.batch} 篇')
+
+    async def fill_abstract(self, pub):
+        """
+        交给空闲的子结点爬取摘要
+        :return: 摘要，未获取到时为None
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._jobs.put_nowait((pub, future, 0))
+        metrics.gauge('node_fleet_queue', self._jobs.qsize())
+        return await future  # 被取消时，子结点的请求随之取消
+
+    async def stream_abstracts(self, pubs):
+        """
+        :return: 异步生成器，先完成的先产出 (pub, abstract, error)
+        """
+        async def fill(pub):
+            try:
+                return pub, await self.fill_abstract(pub), None
+            except NodeFleetError as e:
+                return pub, None, e
+
+        tasks = [asyncio.create_task(fill(pub)) for pub in pubs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _take(self):
+        """
+        :return: 至少一篇，并带上已在排队的文献，不额外等待
+        """
+        jobs = [await self._jobs.get()]
+        while len(jobs) < self.batch and not self._jobs.empty():
+            jobs.append(self._jobs.get_nowait())
+        return [job for job in jobs if not job[1].done()]  # 去掉调用方已取消的
+
+    def _requeue(self, jobs, error):
+        for pub, future, tries in jobs:
+            if future.done():
+                continue
+            if tries >= self.max_requeue:
+                future.set_exception(NodeFleetError(f'子结点均无法启动 {error}'))
+            else:
+                self._jobs.put_nowait((pub, future, tries + 1))
+
+    async def _work(self, worker: NodeWorker):
+        failures = 0
+        while True:
+            jobs = await self._take()
+            if not jobs:
+                continue
+            try:
+                await worker.ensure_started()  # 进程退出时重启
+            except asyncio.CancelledError:
+                self._requeue(jobs, '子结点关闭')
+                raise
+            except Exception as e:
+                # 交给其他子结点，本子结点退避后再试
+                failures += 1
+                self.logger.error(f'子结点 #{worker.index} 重启失败 {failures}次 {type(e)} {e}')
+                self._requeue(jobs, e)
+                await asyncio.sleep(min(60, 2 ** failures))
+                continue
+            failures = 0
+
+            futures = [future for _, future, _ in jobs]
+            request = asyncio.create_task(self._request(worker, jobs))
+
+            def on_done(f, t=request, fs=futures):
+                # 全部调用方已取消时，子结点的请求随之取消
+                if f.cancelled() and all(x.done() for x in fs):
+                    t.cancel()
+
+            for future in futures:
+                future.add_done_callback(on_done)
+            try:
+                await asyncio.wait([request])
+            except asyncio.CancelledError:  # 子结点关闭
+                request.cancel()
+                for future in futures:
+                    future.cancel()
+                raise
+            if request.cancelled():  # 调用方均已取消
+                continue
+            e = request.exception()
+            if e is not None:
+                self.logger.error(f'子结点 #{worker.index} 处理失败 {type(e)} {e}')
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e if isinstance(e, NodeFleetError) else NodeFleetError(e))
+
+    async def _request(self, worker: NodeWorker, jobs):
+        # 不同查询的 task_id 可能相同，按本请求内的序号对应
+        futures = {i: future for i, (_, future, _) in enumerate(jobs)}
+        pubs = [dict(pub, task_id=i) for i, (pub, _, _) in enumerate(jobs)]
+        # 被取消时立即关闭生成器，通知子结点取消
+        async with aclosing(worker.stream(pubs)) as frames:
+            async for frame in frames:  # 读到结束消息为止
+                if frame['type'] == 'progress':
+                    continue
+                future = futures.get(frame['task_id'])
+                if frame['type'] == 'result':
+                    if future is not None and not future.done():
+                        future.set_result(frame['abstract'])
+                elif frame['type'] == 'error':
+                    error = NodeFleetError(f'子结点出错 {frame["error"]}')
+                    targets = [future] if future is not None else futures.values()  # 整个请求出错
+                    for target in targets:
+                        if not target.done():
+                            target.set_exception(error)
+        for future in futures.values():
+            if not future.done():
+                future.set_result(None)  # 未返回结果视为未获取到摘要
+
+    async def collect_metrics(self):
+        """
+        :return: {子结点序号: snapshot}，不含未响应的子结点
+        """
+        snapshots = await asyncio.gather(*[w.query_metrics() for w in self.workers])
+        return {w.index: snapshot for w, snapshot in zip(self.workers, snapshots) if snapshot is not None}
+
+    async def close(self):
+        loops, self._loops = self._loops, []
+        for task in loops:
+            task.cancel()
+        await asyncio.gather(*loops, return_exceptions=True)
+        await asyncio.gather(*[w.stop() for w in self.workers], return_exceptions=True)
+        self.logger.info('子结点已全部关闭')
+
+
+_fleet = None
+_fleet_lock = asyncio.Lock()
+
+
+async def get_fleet() -> NodeFleet:
+    """进程内共用的子结点，首次调用时启动"""
+    global _fleet
+    async with _fleet_lock:
+        if _fleet is None:
+            fleet = NodeFleet(
+                create_logger('fleet', datetime.now()),
+                size=getattr(api_config, 'node_workers', max(1, (os.cpu_count() or 2) // 2)),
+                slots=getattr(api_config, 'browser_pool_size', 2),
+                batch=getattr(api_config, 'node_pages_per_browser', 5),
+            )
+            await fleet.start()
+            _fleet = fleet
+        return _fleet
+
+
+async def fleet_metrics():
+    """
+    :return: 各子结点的指标，子结点尚未启动时为空（不为此启动）
+    """
+    if _fleet is None:
+        return {}
+    return await _fleet.collect_metrics()
+
+
+async def stop_fleet():
+    global _fleet
+    async with _fleet_lock:
+        if _fleet is not None:
+            await _fleet.close()
+            _fleet = None
+
+
+async def create_node_process(logger, port=None):
+    # 获取项目根目录
+    script_path = os.path.abspath(sys.argv[0])
+    project_root = os.path.dirname(script_path)
+    node_script_path = os.path.join(project_root, 'start_node.py')
+
+    # 指定 Miniconda 环境的 Python 解释器路径
+    python_executable = api_config.python_executable
+
+    # 启动 node.py 文件
+    args = [node_script_path] if port is None else [node_script_path, str(port)]
+    node_process = await asyncio.create_subprocess_exec(
+        python_executable, *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    # 常驻进程需持续读取 stderr，避免管道写满阻塞
+    node_process.stderr_tail = collections.deque(maxlen=50)
+    node_process.stderr_task = asyncio.create_task(drain_stream(node_process.stderr, node_process.stderr_tail))
+
+    try:
+        node_process.port = await wait_node_ready(node_process, logger)
+        # 就绪后 stdout 不再使用，同样持续读取
+        node_process.stdout_task = asyncio.create_task(
+            drain_stream(node_process.stdout, collections.deque(maxlen=10)))
+        websocket = await connect_to_node(node_process, logger)
+        return node_process, websocket
+    except Exception as e:
+        if node_process.returncode is None:  # debug
+            logger.error(f"子结点启动失败，准备结束进程")
+            try:
+                node_process.kill()  # 终止子进程
+                await node_process.wait()  # 等待进程完全终止
+                logger.info("已结束子结点进程")
+            # except ProcessLookupError:
+            #     logger.error("尝试终止进程时出错：进程不存在。")
+            except Exception as e:
+                logger.error(f'关闭进程失败 {traceback.format_exc(chain=False)}')
+        raise
+
+
+async def stop_node_process(node_process, logger):
+    if node_process.returncode is not None:
+        return
+
+    try:
+        node_process.terminate()
+        # 等待进程结束，设置超时
+        await asyncio.wait_for(node_process.wait(), 60)
+        logger.info("Node process terminated.")
+    except Exception as e:
+        logger.error(f'Error when terminating {e}')
+        try:
+            node_process.kill()  # 强制结束进程
+            await node_process.wait()  # 等待进程完全终止
+            logger.info("Node process killed.")
+        except Exception as e:
+            logger.error(f'Fail to kill {traceback.format_exc(chain=False)}')
+
+
+async def drain_stream(stream, tail):
+    """读取子进程输出，保留最后几行"""
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        tail.append(line.decode(errors='replace').rstrip())
+
+
+async def wait_node_ready(node_process, logger, timeout=60):
+    """
+    等待子结点在 stdout 报告就绪端口，进程提前退出时立即失败
+    :return: 端口
+    """
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+
+    async def read_ready():
+        while True:
+            line = await node_process.stdout.readline()
+            if not line:  # 进程已关闭输出
+                return None
+            line = line.decode(errors='replace').strip()
+            if line.startswith(NODE_READY):
+                return int(line.split()[1])
+
+    try:
+        port = await asyncio.wait_for(read_ready(), timeout)
+    except asyncio.TimeoutError:
+        raise asyncio.TimeoutError(f"子结点启动超时 {timeout}s")
+
+    if port is None:
+        await node_process.wait()
+        await asyncio.wait([node_process.stderr_task], timeout=5)  # 读完剩余输出
+        stderr_output = '\n'.join(node_process.stderr_tail)
+        exit_code = node_process.returncode
+        logger.error(f"Node Process意外退出 {exit_code}, stderr: {stderr_output}")
+        raise Exception(f"Node Process意外退出 {exit_code}")
+
+    elapsed = loop.time() - start_time
+    metrics.observe('node_startup_sec', elapsed)
+    logger.info(f'子结点已就绪 port:{port} 用时{elapsed:.2f}s')
+    return port
+
+
+async def connect_to_node(node_process, logger):
+    url = f"ws://localhost:{node_process.port}"
+    websocket_connection = await websockets.connect(url)
+    logger.info(f'成功连接到子结点 {url}')
+    return websocket_connection
@@ -6,12 +6,17 @@ from run.ScrapePub1 import ScrapePub1
 from run.pipline1 import ReadResult, RunnerConfig, WriteResult
 
 from tools.bib_tools import add_abstract, del_abstract
+from tools.event_tool import Notifier
 
 
 class Result:
     def __init__(self):
         self.pages = None
-        self.all_pubs = []
+        self.all_pubs = []  # 流式模式下只保留未推送的
+        self.registered = 0
+        self.summary = {'delivered': 0, 'with_abstract': 0, 'with_error': 0}
+        self.settled = {}  # task_id -> 已确定的部分
+        self.patched = set()  # 已先推送、待补发BibTeX的 task_id
         self._i = 0
 
     def set_pages(self, pages):
@@ -28,6 +33,8 @@ class Runner1(ReadResult, WriteResult):
         # 依赖对象
         self.config = config
         self.result = Result()
+        self.events = asyncio.Queue()  # 流式模式下待推送的消息
+        self.notifier = Notifier()  # 进度变化通知
 
     async def finish(self):
         logger = self.config.logger
@@ -59,58 +66,108 @@ class Runner1(ReadResult, WriteResult):
             return 0.0
 
         total = 10 * self.result.pages
-        registered = len(self.result.all_pubs)
+        registered = self.result.registered
         return registered / total
 
+    def get_summary(self):
+        return dict(self.result.summary, registered=self.result.registered)
+
     def deliver_pubs(self):
+        """
+        :return: 尚未推送的结果
+        """
         all_pubs = self.result.all_pubs
         if len(all_pubs) == 0:
             return None
 
+        # 所有已有的结果
+        return [self.deliver_pub(pub) for pub in all_pubs]
+
+    def deliver_pub(self, pub):
         item = self.config.item
+        abstract = pub.get('abstract')
+        obj = {
+            'title': pub['title'],
+            'author': pub['author'],
+            'pub_year': pub['pub_year'],
+            'pub_url': pub['url'],
+            'abstract': abstract,
+            'eprint_url': pub.get('eprint_url'),
+            'num_citations': pub.get('num_citations', None),
+        }
+        # 加入bib
+        if item.ignore_bibtex:
+            obj['bib_link'] = get_bib_link(pub)  # 为以后添加
+        else:
+            obj.update(self.deliver_bib(pub))
+
+        obj['error'] = '; '.join(pub['error']) if len(pub['error']) else None
+        if item.stream:
+            obj['task_id'] = pub['task_id']  # 用于对应补发的BibTeX
+        return obj
+
+    def deliver_bib(self, pub):
         # 缺省值
         empty_bib = {'link': None, 'string': None}
-        results = []
-        # 所有已有的结果
-        for pub in all_pubs:
-            abstract = pub.get('abstract')
-            obj = {
-                'title': pub['title'],
-                'author': pub['author'],
-                'pub_year': pub['pub_year'],
-                'pub_url': pub['url'],
-                'abstract': abstract,
-                'eprint_url': pub.get('eprint_url'),
-                'num_citations': pub.get('num_citations', None),
-            }
-            # 加入bib
-            if item.ignore_bibtex:
-                obj['bib_link'] = get_bib_link(pub)  # 为以后添加
-            else:
-                bib_link = pub.get('BibTeX', empty_bib).get('link')
-                bib_raw = pub.get('BibTeX', empty_bib).get('string')
-                # bib加入摘要
-                if bib_raw and abstract:
-                    bib_str = add_abstract(bib_raw, abstract)
-                elif bib_raw and not abstract:
-                    bib_str = del_abstract(bib_raw)
-                else:
-                    bib_str = None
-
-                obj['bib_link'] = bib_link
-                obj['bib_raw'] = bib_raw
-                obj['bib'] = bib_str
-
-            obj['error'] = '; '.join(pub['error']) if len(pub['error']) else None
-            results.append(obj)
-
-        # 所有已有的结果
-        return results
+        abstract = pub.get('abstract')
+        bib_link = pub.get('BibTeX', empty_bib).get('link')
+        bib_raw = pub.get('BibTeX', empty_bib).get('string')
+        # bib加入摘要
+        if bib_raw and abstract:
+            bib_str = add_abstract(bib_raw, abstract)
+        elif bib_raw and not abstract:
+            bib_str = del_abstract(bib_raw)
+        else:
+            bib_str = None
+
+        return {'bib_link': bib_link, 'bib_raw': bib_raw, 'bib': bib_str}
 
     def register_new(self, pub):
         pub['task_id'] = self.result.next_id()
         pub['error'] = []
+        self.result.registered += 1
         self.result.all_pubs.append(pub)
+        self.notifier.notify()
+        if self.config.item.ignore_bibtex:
+            self.bibtex_settled(pub)
 
     def mark_error(self, pub, error):
         pub['error'].append(error)
+        self.notifier.notify()
+
+    def abstract_settled(self, pub):
+        self._settle(pub, 'abstract')
+
+    def bibtex_settled(self, pub):
+        self._settle(pub, 'bibtex')
+
+    def _settle(self, pub, part):
+        """流式模式下，结果确定后推送，并从结果集中移除"""
+        item = self.config.item
+        if not item.stream:
+            return
+        settled = self.result.settled.setdefault(pub['task_id'], set())
+        if part in settled:
+            return
+        settled.add(part)
+
+        summary = self.result.summary
+        if len(settled) == 2:
+            summary['delivered'] += 1
+            summary['with_abstract'] += bool(pub.get('abstract'))
+            summary['with_error'] += bool(pub['error'])
+            if pub['task_id'] in self.result.patched:  # 已推送，补发BibTeX及此后新增的错误
+                data = self.deliver_bib(pub)
+                data['error'] = '; '.join(pub['error']) if len(pub['error']) else None
+                self.events.put_nowait({'type': 'Patch', 'task_id': pub['task_id'], 'data': data})
+            else:
+                self.events.put_nowait({'type': 'Pub', 'data': self.deliver_pub(pub)})
+            self.result.all_pubs.remove(pub)
+            del self.result.settled[pub['task_id']]
+            self.result.patched.discard(pub['task_id'])
+
+        elif part == 'abstract' and item.stream_patch:
+            self.result.patched.add(pub['task_id'])
+            self.events.put_nowait({'type': 'Pub', 'data': self.deliver_pub(pub)})
+
+        self.notifier.notify()
@@ -3,6 +3,7 @@ import re
 import time
 import traceback
 import urllib.parse
+from contextlib import aclosing
 
 from bs4 import BeautifulSoup
 
@@ -10,6 +11,8 @@ from crawl.by_researchgate import ByResearchGate
 from crawl.by_sema import BySema
 from parse.gpt_do_html import GptDoHtml
 from parse.gpt_do_page_text import GptDoPageText
+from record.AbstractCache import get_abstract_cache
+from record.BibtexCache import get_bibtex_cache
 from record.Record2 import Record2
 from crawl.by_serpdog import BySerpdog, QueryItem
 from crawl.by_nodiver import Crawl
@@ -34,11 +37,12 @@ class Runner2:
         self.record.set_pages(item.pages)
         try:
             # for every 10 pubs
-            async for pubs in self.source.query_scholar(item):
-                # 补充数据任务
-                self.logger.info(f'准备异步爬取pubs {len(pubs)}')
-                tasks = [self.fill_pub(pub, item) for pub in pubs]  # 假设协程内已处理异常
-                await asyncio.gather(*tasks)
+            async with aclosing(self.source.query_scholar(item)) as pages:
+                async for pubs in pages:
+                    # 补充数据任务
+                    self.logger.info(f'准备异步爬取pubs {len(pubs)}')
+                    tasks = [self.fill_pub(pub, item) for pub in pubs]  # 假设协程内已处理异常
+                    await asyncio.gather(*tasks)
 
         except asyncio.CancelledError as e:
             self.logger.error('任务取消' + '\n' + traceback.format_exc())
@@ -64,8 +68,13 @@ class Runner2:
                 return
 
         try:
-            # 先获取摘要
-            succeed = await self.fill_abstract_directly(pub)
+            # 先查缓存，再获取摘要
+            cache = get_abstract_cache()
+            pub['abstract'] = await cache.get(pub)
+            succeed = bool(pub['abstract'])
+
+            if not succeed:
+                succeed = await self.fill_abstract_directly(pub)
 
             if not succeed:
                 succeed = await self.fill_abstract_by_rg(pub)
@@ -78,6 +87,8 @@ class Runner2:
                 self.record.fail_to_fill(pub)
                 return  # 结束后续环节
 
+            await cache.put(pub, pub['abstract'])
+
             # 摘要获取后，再bibtex
             if await self.fill_bibtex(pub, item):
                 self.record.success_fill(pub)
@@ -107,7 +118,7 @@ class Runner2:
             self.logger.error(f'直接爬取摘要失败 {e}')
             return False
 
-        gpt = GptDoPageText(self.logger)
+        gpt = GptDoPageText(timeout=60)
         try:
             pub['abstract'] = await gpt.get_abstract(pub['cut'], html_str)
             self.logger.info(f'直接爬取到摘要 {pub["url"]}')
@@ -127,7 +138,7 @@ class Runner2:
             self.logger.error(f'Reseachgate获取其他版本链接失败')
             return False
 
-        gpt = GptDoPageText(self.logger)
+        gpt = GptDoPageText(timeout=60)
         for link in links:
             try:
                 self.logger.info(f'尝试Reseachgate的其他版本 {link}')
@@ -173,9 +184,24 @@ class Runner2:
 
     async def fill_bibtex(self, pub, item):
         pub['BibTeX'] = {'link': None, 'string': None}
+        cache = get_bibtex_cache()
+        # 先查缓存
+        cached = await cache.get(pub)
+        if cached is not None:
+            if 'error' in cached:
+                self.logger.error(f'BibTeX缓存记录为失败 {cached["error"]}')
+                return False
+            pub['BibTeX'] = cached
+            return True
+
         try:
             # 获取链接
-            bib_link = await self.source.get_bibtex_link(pub, item)
+            try:
+                bib_link = await self.source.get_bibtex_link(pub, item)
+            except KeyError as e:
+                # 没有BibTeX链接，永久性失败
+                await cache.put_failure(pub, e)
+                raise
             pub['BibTeX']['link'] = bib_link
             # 获取内容
             html_str = await self.crawl.fetch_page(bib_link, wait_sec=1)
@@ -190,6 +216,7 @@ class Runner2:
                 pub['BibTeX']['string'] = match.group()
 
             # 成功返回
+            await cache.put(pub, pub['BibTeX'])
             return True
 
         except asyncio.CancelledError:
@@ -1,34 +1,38 @@
 import asyncio
+from contextlib import aclosing
 
 from parse.parse_html import HTMLParse
 from parse.gpt_do_xpath import get_xpath_by_gpt
-from record.Record2 import Record2
+from parse.rule_abstract import matches_cut
+from record.RecordEx import RecordEx, url_pattern
 from crawl.by_scholarly import query_scholar
 from crawl.by_nodiver import Crawl
+from run.pipline1 import QueryItem
 
 
 class RunnerEx:
-    def __init__(self, crawl: Crawl, record: Record2):
+    def __init__(self, crawl: Crawl, record: RecordEx):
         self.crawl = crawl
         self.record = record
 
-    async def run(self, name, *args, **kwargs):
+    async def run(self, item: QueryItem):
         # 创建查询
-        for pubs in query_scholar(name, *args, **kwargs):
-            # 爬取网页
-            tasks = [self.handle(pub) for pub in pubs]
-            results = await asyncio.gather(*tasks)
+        async with aclosing(query_scholar(item)) as pages:
+            async for pubs in pages:
+                # 爬取网页
+                tasks = [self.handle(pub) for pub in pubs]
+                results = await asyncio.gather(*tasks)
 
     async def handle(self, pub):
         # 爬取网页
         html_str = await self.crawl.fetch_page(pub['url'])
         # 处理内容
-        pub['abstract'] = await self.handle_page(pub['url'], html_str)
+        pub['abstract'] = await self.handle_page(pub['url'], html_str, pub['cut'])
         # 保存数据
         self.record.save_pub(pub)
         return pub
 
-    async def handle_page(self, url, html_str):
+    async def handle_page(self, url, html_str, cut):
         # 解析网页
         # if 陌生网页
         # then 寻找元素，保存信息
@@ -42,10 +46,14 @@ class RunnerEx:
                 # 单独尝试xpaths
                 abstract = '\n'.join(parse.get_texts(xpaths))
             except Exception as err:
-                # 确定xpaths不可用
-                self.record.disable_xpaths(base_url)
+                abstract = None
+            if not matches_cut(abstract, cut):  # 提取失败，或提取结果与摘要片段不符
+                # 确定xpaths不可用（借用同网站其他模式时不停用）
+                if base_url == url_pattern(url):
+                    self.record.disable_xpaths(base_url)
                 return await self.handle_unknown_page(url, html_str)
 
+            self.record.success_xpaths(base_url)
             return abstract
 
     async def handle_unknown_page(self, url, html_str):
@@ -53,7 +61,7 @@ class RunnerEx:
         # 访问GPT，提取结果
         try:
             # 统一尝试
-            xpaths = get_xpath_by_gpt(parse.root)
+            xpaths = await get_xpath_by_gpt(parse.root)
             # next 提取网页
             abstract = '\n'.join(parse.get_texts(xpaths))
         except Exception as err:
@@ -1,8 +1,10 @@
 import asyncio
-import json
 import traceback
+from contextlib import aclosing
 
-from crawl.by_scholarly import query_scholar, fill_bibtex
+from crawl.by_scholarly import query_scholar, fill_bibtex, BibtexMissingError
+from record.AbstractCache import get_abstract_cache
+from record.BibtexCache import get_bibtex_cache
 from run.pipline1 import RunnerConfig, WriteResult
 from data import api_config
 
@@ -15,37 +17,47 @@ class ScrapePub1:
         self.writer = writer
         self._pubs_queue = asyncio.Queue(maxsize=1)  # 缓存队列，提取准备下一次的文献
         self._bibtex_lock = asyncio.Semaphore(5)  # 请求锁，限制访问量
+        # 同时处理的页数，处理完一页才取下一页，预取随之受限
+        self._pages_lock = asyncio.Semaphore(getattr(api_config, 'scholarly_prefetch_pages', 2) + 1)
 
     async def producer(self):
         logger = self.config.logger
         item = self.config.item
         queue = self._pubs_queue
 
-        async for pubs in query_scholar(item):
-            for pub in pubs:
-                self.writer.register_new(pub)  # 加入到结果集中
-            logger.debug(f'新加入结果集 {display_pub_url(pubs)}')
-            await queue.put(pubs)
+        # 取消时关闭生成器，停止预取
+        async with aclosing(query_scholar(item)) as pages:
+            async for pubs in pages:
+                for pub in pubs:
+                    self.writer.register_new(pub)  # 加入到结果集中
+                logger.debug(f'新加入结果集 {display_pub_url(pubs)}')
+                await queue.put(pubs)
 
         await queue.put(None)  # 放入特殊标记，表示结束
 
     async def consumer(self):
         logger = self.config.logger
-        websocket = self.config.websocket
         queue = self._pubs_queue
+        tasks = []  # 各页同时处理，不等待上一页最慢的文献
         try:
             while True:
+                await self._pages_lock.acquire()
                 pubs = await queue.get()
                 if pubs is None:  # 检查特殊标记
-                    logger.info(f'consumer已完成所有pubs的处理')
+                    self._pages_lock.release()
                     break
 
-                await self.process_pubs(pubs)  # 异步浏览器爬取
+                task = asyncio.create_task(self.process_pubs(pubs))  # 异步浏览器爬取
+                task.add_done_callback(lambda t: self._pages_lock.release())
+                tasks.append(task)
                 queue.task_done()  # 本次处理周期结束
+
+            await asyncio.gather(*tasks)
+            logger.info(f'consumer已完成所有pubs的处理')
         finally:
-            # 所有任务都结束时
-            if not websocket.closed:
-                await websocket.close()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     async def process_pubs(self, pubs):
         logger = self.config.logger
@@ -58,6 +70,8 @@ class ScrapePub1:
             for pub in pubs:
                 if pub.get('num_citations', 0) < min_cite:
                     self.writer.mark_error(pub, '引用数量过滤')
+                    self.writer.abstract_settled(pub)
+                    self.writer.bibtex_settled(pub)
                 else:
                     pubs_to_fill.append(pub)
             pubs = pubs_to_fill
@@ -80,22 +94,32 @@ class ScrapePub1:
 
     async def send_to_fill_abstract(self, pubs):
         logger = self.config.logger
-        websocket = self.config.websocket
-        logger.info(f'准备调用子结点处理 {len(pubs)}')
-        try:
-            await websocket.send(json.dumps({'pubs': pubs}))
-            message = await websocket.recv()
-            obj = json.loads(message)
-            if 'error' in obj:
-                logger.error(f'子结点出错 {obj["error"]}')
-                raise Exception(f'子结点爬取摘要出错')
+        fleet = self.config.fleet
+        cache = get_abstract_cache()
+        # 先查缓存，命中的不再打开网页
+        pubs_to_fill = []
+        for pub in pubs:
+            abstract = await cache.get(pub)
+            if abstract:
+                pub['abstract'] = abstract
+                logger.debug(f'摘要缓存命中 #{pub["task_id"]}')
+                self.writer.abstract_settled(pub)
             else:
-                logger.info(f'子结点处理完成')
-                result = {pub['task_id']: pub for pub in obj['pubs']}
-                for pub in pubs:
-                    pub['abstract'] = result[pub['task_id']].get('abstract')
-                    if not pub['abstract']:
-                        self.writer.mark_error(pub, '爬取摘要失败')
+                pubs_to_fill.append(pub)
+
+        logger.info(f'准备调用子结点处理 {len(pubs_to_fill)}')
+        try:
+            # 逐篇交给子结点，每篇完成即处理
+            async for pub, abstract, error in fleet.stream_abstracts(pubs_to_fill):
+                pub['abstract'] = abstract
+                if error is not None:
+                    logger.error(f'子结点出错 {error} #{pub["task_id"]}')
+                if not abstract:
+                    self.writer.mark_error(pub, '爬取摘要失败')
+                else:
+                    await cache.put(pub, abstract)
+                self.writer.abstract_settled(pub)
+            logger.info(f'子结点处理完成')
 
         except asyncio.CancelledError:
             logger.debug(f'子结点任务被取消')  # 日志调试打印
@@ -108,6 +132,19 @@ class ScrapePub1:
         """
         using_proxy = api_config.scholarly_use_proxy
         logger = self.config.logger
+        cache = get_bibtex_cache()
+        if tries == 0:
+            # 先查缓存
+            cached = await cache.get(pub)
+            if cached is not None:
+                logger.debug(f'bibtex缓存命中 #{pub["task_id"]}')
+                if 'error' in cached:
+                    self.writer.mark_error(pub, f'bibtex获取失败 {cached["error"]}')
+                else:
+                    pub['BibTeX'] = cached
+                self.writer.bibtex_settled(pub)
+                return
+
         succeed = False
         async with self._bibtex_lock:
             try:
@@ -116,12 +153,22 @@ class ScrapePub1:
                 succeed = True
             except asyncio.TimeoutError as e:
                 logger.debug(f'bibtex获取超时,已尝试{tries + 1} #{pub["task_id"]}')
+            except BibtexMissingError as e:
+                # 永久性失败，不再重试
+                await cache.put_failure(pub, e)
+                self.writer.mark_error(pub, f'bibtex获取失败 {e}')
+                self.writer.bibtex_settled(pub)
+                return
             except asyncio.CancelledError:
                 logger.info(f'取消bibtex任务 #{pub["task_id"]}')
                 raise
 
-        if not succeed:
+        if succeed:
+            await cache.put(pub, pub['BibTeX'])
+            self.writer.bibtex_settled(pub)
+        else:
             if tries <= 0 and using_proxy:  # 最多尝试两次
                 await self.fill_bibtex(pub, tries + 1)
             else:
                 self.writer.mark_error(pub, 'bibtex获取失败')  # 确保只mark一次
+                self.writer.bibtex_settled(pub)
@@ -1,7 +1,4 @@
 import logging
-import asyncio.subprocess
-
-import websockets
 
 
 class QueryItem:
@@ -11,6 +8,8 @@ class QueryItem:
     year_high: int
     min_cite: int
     ignore_bibtex: bool
+    stream: bool  # 逐篇推送结果
+    stream_patch: bool  # 摘要完成即推送，BibTeX稍后补发
 
     # def __init__(self, name, pages, year_low=None, year_high=None, min_cite=None, ignore_bibtex=False):
     #     self.name = name
@@ -27,8 +26,7 @@ class QueryItem:
 class RunnerConfig:
     logger: logging.Logger
     item: QueryItem
-    websocket: websockets.WebSocketClientProtocol
-    node_process: asyncio.subprocess.Process
+    fleet: 'NodeFleet'
 
 
 class ReadResult:
@@ -46,6 +44,14 @@ class WriteResult:
     def mark_error(self, pub, error):
         pass
 
+    def abstract_settled(self, pub):
+        """摘要已有结果（成功或失败）"""
+        pass
+
+    def bibtex_settled(self, pub):
+        """BibTeX已有结果（成功或失败）"""
+        pass
+
 
 class GoodbyeBecauseOfError(Exception):
     pass
@@ -1,6 +1,9 @@
 import asyncio
+import sys
 
 from node.server import open_server
 
 if __name__ == '__main__':
-    asyncio.run(open_server())
+    # 可选参数：端口
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    asyncio.run(open_server(port))
@@ -0,0 +1,54 @@
+import asyncio
+
+
+class Notifier:
+    """
+    进度变化通知，等待方在有变化时立即被唤醒
+    """
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def notify(self):
+        self._event.set()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
+
+
+async def watch_task(task, notifier: Notifier, send_progress, flush=None, stop=None, min_gap=1.0, keepalive=5.0):
+    """
+    任务进行中推送进度：有变化时尽快发送（间隔不小于min_gap），无变化时每keepalive发送心跳；
+    任务结束或stop完成时立即返回
+    :param send_progress: 发送进度的协程函数
+    :param flush: 每次被唤醒时调用的协程函数，不限流
+    :param stop: 提前结束的信号，例如连接断开
+    """
+    loop = asyncio.get_running_loop()
+    last_sent = None
+    stops = {task} if stop is None else {task, stop}
+    while not any(t.done() for t in stops):
+        if flush is not None:
+            await flush()
+
+        now = loop.time()
+        if last_sent is None or now - last_sent >= min_gap:
+            await send_progress()
+            last_sent = now
+            timeout = keepalive
+        else:
+            timeout = min_gap - (now - last_sent)  # 限流，到期后发送
+
+        waiter = asyncio.ensure_future(notifier.wait())
+        try:
+            await asyncio.wait({waiter, *stops}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+
+
+async def wait_disconnect(websocket):
+    """客户端断开时返回"""
+    while True:
+        message = await websocket.receive()
+        if message['type'] == 'websocket.disconnect':
+            return
@@ -0,0 +1,50 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tools.metric_tool import metrics
+
+
+class MeteredExecutor:
+    """
+    专用线程池，记录排队数、执行数和排队耗时（指标名以name开头）
+    """
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+
+    def _update(self, queued=0, active=0):
+        with self._lock:
+            self.queued += queued
+            self.active += active
+            metrics.gauge(f'{self.name}_queue', self.queued)
+            metrics.gauge(f'{self.name}_active', self.active)
+
+    async def run(self, fn, *args):
+        """在线程池中执行fn，返回结果"""
+        submitted = time.perf_counter()
+
+        def call():
+            self._update(queued=-1, active=1)
+            metrics.observe(f'{self.name}_wait_sec', time.perf_counter() - submitted)
+            try:
+                return fn(*args)
+            finally:
+                self._update(active=-1)
+
+        self._update(queued=1)
+        try:
+            future = self.executor.submit(call)
+        except RuntimeError:
+            self._update(queued=-1)  # 已关闭
+            raise
+        # 排队中被取消时不会执行call
+        future.add_done_callback(lambda f: f.cancelled() and self._update(queued=-1))
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
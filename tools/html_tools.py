@@ -90,3 +90,38 @@ def find_tag(root, xpath):
         
     # end for
     return soup
+
+
+def normalize_text(s):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', s.lower()).split())
+
+
+def find_tag_by_text(root, text, head=40):
+    """
+    找到包含整段文字的最小标签，用于记住摘要所在位置
+
+    参数:
+    root (tag): BeautifulSoup根节点
+    text (str): 要定位的文字，例如GPT提取的摘要
+
+    返回:
+    bs4.element.Tag: 定位到的结点，找不到或范围过大（超过文字3倍）时返回 None
+    """
+    target = normalize_text(text)
+    if len(target) < head:
+        return None
+    start, end = target[:head], target[-head:]
+    for s in root.find_all(string=True):
+        if s.parent.name in ('script', 'style',) or start[:20] not in normalize_text(s):
+            continue
+
+        # 从文字开头所在标签向上，直到包含结尾
+        tag = s.parent
+        while tag is not None and tag.name not in ('html', '[document]'):
+            norm = normalize_text(tag.get_text(' '))
+            if len(norm) > 3 * len(target):
+                break
+            if start in norm and end in norm:
+                return tag if tag.find_parent('html') else None
+            tag = tag.parent
+    return None
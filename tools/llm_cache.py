@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+
+from data import api_config
+from record.SqliteCache import SqliteCache
+from tools.metric_tool import metrics
+
+
+def fingerprint(query, model=None, max_tokens=None, temperature=0.5):
+    """
+    :return: 提问的指纹，空白不同的相同提问视为一致
+    """
+    obj = {
+        'backend': getattr(api_config, 'llm_backend', 'openai'),
+        'model': model or getattr(api_config, 'openai_model', 'gpt-4o-mini'),
+        'max_tokens': max_tokens or getattr(api_config, 'openai_max_tokens', 1024),
+        'temperature': temperature,
+        'query': ' '.join(query.split()),
+    }
+    return hashlib.sha256(json.dumps(obj, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    GPT回答缓存：内存LRU，可选磁盘；同时进行的相同提问只请求一次
+    """
+    def __init__(self, max_items, disk: SqliteCache = None):
+        self.max_items = max_items
+        self.disk = disk
+        self._memory = OrderedDict()
+        self._inflight = {}
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    async def get_or_call(self, key, call):
+        """
+        :param call: 未命中时调用的协程函数，抛出异常时不缓存
+        :return: 回答
+        """
+        while True:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                metrics.incr('llm_cache_hit')
+                return self._memory[key]
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            metrics.incr('llm_cache_coalesced')
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():  # 自身被取消
+                    raise
+                # 发起方被取消，重新请求
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())  # 无人等待时不报警告
+        self._inflight[key] = future
+        try:
+            value = await self.disk.aget_first([key]) if self.disk is not None else None
+            if value is None:
+                metrics.incr('llm_cache_miss')
+                value = await call()
+                if self.disk is not None:
+                    await self.disk.aset_many([key], value)
+            else:
+                metrics.incr('llm_cache_disk_hit')
+            self._remember(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+
+_cache = None
+
+
+def get_llm_cache() -> LLMCache:
+    global _cache
+    if _cache is None:
+        disk = None
+        if getattr(api_config, 'llm_cache_disk', False):
+            disk = SqliteCache(getattr(api_config, 'llm_cache_path', 'data/cache/llm.sqlite3'), 'llm',
+                               max_items=getattr(api_config, 'llm_cache_disk_max_items', 50000),
+                               default_ttl=getattr(api_config, 'llm_cache_ttl', 7 * 24 * 3600))
+        _cache = LLMCache(getattr(api_config, 'llm_cache_max_items', 1000), disk)
+    return _cache
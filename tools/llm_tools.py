@@ -1,61 +1,280 @@
-# openai == 0.27.6
-import openai
+# GPT后端：OpenAI 兼容接口（进程内共用一个会话）或离线的本地后端
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+
+import aiohttp
+
 from data import api_config
+from tools.html_tools import normalize_text
+from tools.metric_tool import metrics
 
-openai.api_base = api_config.openai_api_base
-openai.api_key = api_config.openai_api_key
-
-
-async def ask_gpt_async(query, timeout):
-    messages = [
-        {"role": "user", "content": query},
-    ]
-    response = await openai.ChatCompletion.acreate(
-        model="gpt-4o-mini",
-        messages=messages,
-        max_tokens=1024,
-        n=1,
-        stop=None,
-        temperature=0.5,
-        timeout=timeout,
-    )
-    return response.choices[0].message.content
-
-
-def ask_gpt(query):
-    #   openai.api_base = "https://giegie.green/"
-    #     print (openai.api_key)
-
-    try:
-        completion = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            # model="gpt-4",
-            #             model="gpt-4-0613",
-            #             stream=True,
-            messages=[{'role': 'user', 'content': query}, ]
-        )
-        #         print(completion)
 
-        #         for event in completion:
-        #             print (event)
+class LLMError(Exception):
+    pass
+
+
+class CircuitOpenError(LLMError):
+    pass
+
+
+class RetryableError(LLMError):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    连续失败达到threshold次后熔断，cooldown秒内直接拒绝；之后只放行一个试探请求，
+    试探成功则恢复，失败则重新熔断，试探期间其余请求仍被拒绝
+    """
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def check(self):
+        if self.opened_at is None:
+            return
+        if time.monotonic() - self.opened_at < self.cooldown:
+            raise CircuitOpenError(f'GPT接口熔断中，连续失败{self.failures}次')
+        if self.probing:
+            raise CircuitOpenError('GPT接口熔断试探中')
+        self.probing = True
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                metrics.incr('llm_circuit_open')
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """请求未完成（被取消或请求本身有误），不影响熔断状态，放行下一个试探"""
+        self.probing = False
+
+
+class LLMBackend(ABC):
+    """
+    GPT后端接口
+    """
+    @abstractmethod
+    async def chat(self, query, timeout=None, model=None, max_tokens=None, temperature=0.5):
+        """
+        :return: 回答文本
+        """
+
+    async def close(self):
+        pass
+
+
+class LLMClient(LLMBackend):
+    def __init__(self, api_base, api_key, concurrency, retries, breaker: CircuitBreaker):
+        self.url = api_base.rstrip('/') + '/chat/completions'
+        self.api_key = api_key
+        self.retries = retries
+        self.breaker = breaker
+        self._limiter = asyncio.Semaphore(concurrency)
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=0, ttl_dns_cache=300, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, headers={
+                'Authorization': f'Bearer {self.api_key}',
+            })
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _post(self, payload, timeout):
+        async with self.session.post(self.url, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            if resp.status == 429 or resp.status >= 500:
+                retry_after = resp.headers.get('Retry-After', '')
+                raise RetryableError(f'{resp.status} {await resp.text()}',
+                                     float(retry_after) if retry_after.isdigit() else None)
+            if resp.status != 200:
+                raise LLMError(f'{resp.status} {await resp.text()}')  # 请求本身有误，重试无用
+            return await resp.json()
+
+    async def _attempt(self, payload, deadline):
+        """
+        :param deadline: loop.time() 的截止时间，None 为不限时
+        """
+        loop = asyncio.get_running_loop()
+        if deadline is None:
+            async with self._limiter:
+                return await self._post(payload, None)
 
-        msg = None
-        choices = completion.get('choices', None)
-        if choices:
+        try:
+            await asyncio.wait_for(self._limiter.acquire(), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            raise LLMError('GPT请求排队超时')  # 不是接口的问题，不计入熔断
+        try:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise LLMError('GPT请求超时')
+            return await self._post(payload, remaining)
+        finally:
+            self._limiter.release()
 
-            msg = choices[0]['message']['content'] + '\n\n'
+    async def chat(self, query, timeout=None, model=None, max_tokens=None, temperature=0.5):
+        payload = {
+            'model': model or getattr(api_config, 'openai_model', 'gpt-4o-mini'),
+            'messages': [{'role': 'user', 'content': query}],
+            'max_tokens': max_tokens or getattr(api_config, 'openai_max_tokens', 1024),
+            'n': 1,
+            'temperature': temperature,
+        }
+        # timeout 为总时限，包括排队、重试和退避
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout else None
+        for attempt in range(self.retries + 1):
+            self.breaker.check()
+            start = time.perf_counter()
+            try:
+                obj = await self._attempt(payload, deadline)
+            except (aiohttp.ClientError, asyncio.TimeoutError, RetryableError) as e:
+                metrics.incr('llm_errors')
+                self.breaker.failure()
+                if attempt >= self.retries:
+                    raise LLMError(f'GPT请求失败，已重试{attempt}次 {type(e).__name__} {e}')
+                # 指数退避加随机抖动
+                delay = getattr(e, 'retry_after', None) or min(30.0, 2 ** attempt) * (0.5 + random.random())
+                if deadline is not None and loop.time() + delay >= deadline:
+                    raise LLMError(f'GPT请求失败，剩余时间不足以重试，已重试{attempt}次 {type(e).__name__} {e}')
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+
+            self.breaker.success()
+            metrics.observe('llm_latency_sec', time.perf_counter() - start)
+            usage = obj.get('usage') or {}
+            metrics.incr('llm_requests')
+            metrics.incr('llm_prompt_tokens', usage.get('prompt_tokens', 0))
+            metrics.incr('llm_completion_tokens', usage.get('completion_tokens', 0))
+            return obj['choices'][0]['message']['content']
+
+
+class LocalBackend(LLMBackend):
+    """
+    离线后端，不访问网络：按固定延迟返回确定的结果，用于压测和容量评估
+    - 摘要提问：返回网页内容中包含摘要片段开头的一行，找不到时返回最长的一行
+    - 批量提问：按编号返回json
+    - xpath提问：返回最长的文字片段
+    """
+    def __init__(self, latency, jitter=0.0, concurrency=None):
+        self.latency = latency
+        self.jitter = jitter
+        self._limiter = asyncio.Semaphore(concurrency) if concurrency else None
+
+    async def chat(self, query, timeout=None, model=None, max_tokens=None, temperature=0.5):
+        start = time.perf_counter()
+        if self._limiter is not None:
+            async with self._limiter:
+                ans = await self._answer(query)
         else:
-            msg = completion['message']['content'] + '\n\n'
-
-    except Exception as err:
-        msg = 'False'
-        msg = (str)(err)
-        print('OpenAI API Error:' + msg)
-        #         print ('OpenAI API Error!!!!!!!')
-        i = 0
-        while msg == 'False' and i < 4:
-            msg = ask_gpt(query)
-            i = i + 1
-    #             if msg != 'False':
-    #                 break
-    return msg
+            ans = await self._answer(query)
+        metrics.observe('llm_latency_sec', time.perf_counter() - start)
+        metrics.incr('llm_requests')
+        metrics.incr('llm_prompt_tokens', len(query) // 4)
+        metrics.incr('llm_completion_tokens', len(ans) // 4)
+        return ans
+
+    async def _answer(self, query):
+        # 延迟只与提问内容有关，结果可复现
+        delay = self.latency + self.jitter * (hash_text(query) % 1000) / 1000
+        await asyncio.sleep(delay)
+
+        if '### 编号' in query:
+            sections = re.split(r'^### 编号 (\d+)$', query, flags=re.M)[1:]
+            answers = {}
+            for number, body in zip(sections[::2], sections[1::2]):
+                cut, _, web_txt = body.partition('网页内容：')
+                answers[number] = self.find_abstract(cut.replace('不完整的摘要：', ''), web_txt)
+            return json.dumps(answers, ensure_ascii=False)
+
+        if '文字片段' in query:
+            pieces = re.findall(r'^(文字片段\d+)：(.*)$', query, flags=re.M)
+            return max(pieces, key=lambda p: len(p[1]))[0] if pieces else ''
+
+        m = re.search(r'以下是一段不完整的摘要：\n(.*?)\n以下是该文章/出版物的网页内容：\n(.*)\n', query, re.S)
+        if m:
+            return self.find_abstract(m.group(1), m.group(2))
+        return self.find_abstract('', query)
+
+    @staticmethod
+    def find_abstract(cut, web_txt):
+        lines = [line.strip() for line in web_txt.split('\n') if line.strip()]
+        if not lines:
+            return ''
+        prefix = normalize_text(cut)[:40]
+        for line in lines:
+            if prefix and prefix in normalize_text(line):
+                return line
+        return max(lines, key=len)
+
+
+def hash_text(text):
+    return int(hashlib.md5(text.encode('utf-8')).hexdigest()[:8], 16)
+
+
+_client = None
+
+
+def get_client() -> LLMBackend:
+    """
+    按 api_config.llm_backend 选择后端：'openai'（默认）或 'local'
+    """
+    global _client
+    if _client is None and getattr(api_config, 'llm_backend', 'openai') == 'local':
+        _client = LocalBackend(
+            getattr(api_config, 'llm_local_latency', 1.0),
+            jitter=getattr(api_config, 'llm_local_jitter', 0.0),
+            concurrency=getattr(api_config, 'llm_concurrency', 8),
+        )
+    if _client is None:
+        _client = LLMClient(
+            api_config.openai_api_base,
+            api_config.openai_api_key,
+            concurrency=getattr(api_config, 'llm_concurrency', 8),
+            retries=getattr(api_config, 'llm_retries', 3),
+            breaker=CircuitBreaker(
+                getattr(api_config, 'llm_breaker_threshold', 5),
+                getattr(api_config, 'llm_breaker_cooldown', 30),
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+async def ask_gpt_async(query, timeout, model=None, max_tokens=None):
+    """
+    :param model: 默认 api_config.openai_model
+    :param max_tokens: 默认 api_config.openai_max_tokens
+    """
+    return await get_client().chat(query, timeout, model=model, max_tokens=max_tokens)
@@ -0,0 +1,102 @@
+import asyncio
+import contextlib
+import threading
+import time
+
+
+class Metrics:
+    """
+    进程内的简单指标：计数、耗时、当前值
+    """
+    def __init__(self):
+        self._lock = threading.Lock()  # 线程池中也会记录
+        self.counters = {}
+        self.gauges = {}
+        self.timings = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value):
+        with self._lock:
+            t = self.timings.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0})
+            t['count'] += 1
+            t['total'] += value
+            t['max'] = max(t['max'], value)
+            t['last'] = value
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def ratio(self, hit, miss):
+        """命中率，无数据时返回None"""
+        h = self.counters.get(hit, 0)
+        m = self.counters.get(miss, 0)
+        return h / (h + m) if h + m else None
+
+    def snapshot(self):
+        with self._lock:
+            timings = {}
+            for name, t in self.timings.items():
+                timings[name] = dict(t, avg=t['total'] / t['count'])
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'timings': timings,
+            }
+
+
+# 进程内共用
+metrics = Metrics()
+
+
+def merge_snapshots(main, nodes):
+    """
+    合并主进程与各子结点的指标：计数相加，耗时合并，当前值按子结点区分（node0.loop_lag_ms）
+    :param nodes: {子结点序号: snapshot}
+    """
+    counters = dict(main['counters'])
+    gauges = dict(main['gauges'])
+    timings = {name: dict(t) for name, t in main['timings'].items()}
+    for index, snapshot in sorted(nodes.items()):
+        for name, value in snapshot['counters'].items():
+            counters[name] = counters.get(name, 0) + value
+        for name, value in snapshot['gauges'].items():
+            gauges[f'node{index}.{name}'] = value
+        for name, t in snapshot['timings'].items():
+            if name not in timings:
+                timings[name] = dict(t)
+                continue
+            merged = timings[name]
+            merged['count'] += t['count']
+            merged['total'] += t['total']
+            merged['max'] = max(merged['max'], t['max'])
+            merged['last'] = t['last']
+            merged['avg'] = merged['total'] / merged['count']
+    return {'counters': counters, 'gauges': gauges, 'timings': timings}
+
+
+async def monitor_loop_lag(interval=0.5, logger=None, warn_sec=0.2):
+    """
+    记录事件循环延迟：定时醒来的实际时间比预期晚多少，即循环被阻塞的时间
+    :param logger: 提供时，延迟超过warn_sec记录警告
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = loop.time() - start - interval
+        metrics.gauge('loop_lag_ms', round(lag * 1000, 1))
+        metrics.observe('loop_lag_sec', lag)
+        if logger is not None and lag > warn_sec:
+            logger.warning(f'事件循环阻塞 {lag:.2f}s')
@@ -0,0 +1,64 @@
+import re
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+
+def normalize_url(url):
+    """
+    统一网址写法：小写域名、去掉www、锚点、末尾斜杠和跟踪参数，参数排序
+    """
+    if not url:
+        return None
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = [(k, v) for k, v in parse_qsl(parts.query) if not k.lower().startswith('utm_')]
+    path = parts.path.rstrip('/')
+    query = urlencode(sorted(query))
+    return host + path + ('?' + query if query else '')
+
+
+def normalize_title(title):
+    if not title:
+        return None
+    return ' '.join(re.split(r'[^a-z0-9]+', title.lower())).strip() or None
+
+
+def first_author(author):
+    """
+    :param author: scholarly的 'A Smith, B Jones'，或serpdog的 'A Smith, B Jones - Journal, 2020 - site'
+    """
+    if not author:
+        return None
+    name = re.split(r',|\s-\s|…', author)[0]
+    return ' '.join(name.lower().split()) or None
+
+
+def get_scholar_id(pub):
+    """
+    :return: 谷歌学术的文献id，来自scholarly的url_scholarbib或serpdog的id
+    """
+    if pub.get('id'):
+        return pub['id']
+
+    raw_pub = pub.get('raw_pub') or {}
+    m = re.search(r'info:([\w-]+):', raw_pub.get('url_scholarbib') or '')
+    return m.group(1) if m else None
+
+
+def pub_keys(pub):
+    """
+    :return: 用于缓存的键，按可靠程度排序
+    """
+    keys = []
+    scholar_id = get_scholar_id(pub)
+    if scholar_id:
+        keys.append(f'scholar:{scholar_id}')
+    url = normalize_url(pub.get('url'))
+    if url:
+        keys.append(f'url:{url}')
+    title = normalize_title(pub.get('title'))
+    author = first_author(pub.get('author'))
+    if title and author:
+        keys.append(f'title:{title}|{author}')
+    return keys